@@ -0,0 +1,365 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, UTC
+from pathlib import Path
+
+# endpoint benchmarks.
+# drives the real app through flask's test client against generated databases (database/generate.py)
+# of increasing size and records, per endpoint: latency percentiles, sql statements per request and
+# peak python memory for one traced request. each dataset is measured in a fresh process on a scratch
+# copy of the database (checkout writes bookings), and the results are saved as json so runs from two
+# commits can be compared with --compare.
+#
+#   python -m benchmarks.run --scales 1,10
+#   python -m benchmarks.run --scales 1 --compare benchmarks/results/<earlier run>.json
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT / "benchmarks" / ".data"
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+PASSWORD = "Passw0rd!"
+STAFF_EMAIL = "loadtest@skywing.com"
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        "p50": round(percentile(ordered, 50), 3),
+        "p90": round(percentile(ordered, 90), 3),
+        "p99": round(percentile(ordered, 99), 3),
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def dataset_path(scale: float, seed: int, now: datetime) -> Path:
+    return DATA_DIR / f"load-{scale:g}x-seed{seed}-{now:%Y%m%d%H}.sqlite3"
+
+
+# builds (once) the generated database for a scale; datasets are anchored on the current hour so
+# "today" has flights for the staff pages
+def ensure_dataset(scale: float, seed: int, now: datetime) -> Path:
+    path = dataset_path(scale, seed, now)
+    if path.exists():
+        return path
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    print(f"generating {path.name} ...", flush=True)
+    subprocess.run(
+        [sys.executable, "-m", "database.generate", "--db", f"sqlite:///{partial}", "--scale", str(scale),
+         "--seed", str(seed), "--now", now.isoformat()],
+        cwd=ROOT, check=True, env={**os.environ, "PYTHONPATH": str(ROOT)},
+    )
+    partial.rename(path)
+    return path
+
+
+# ---- in the measuring process ----
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def login(client, email):
+    client.get("/auth/logout")
+    r = client.post("/auth/login", data={"email": email, "password": PASSWORD})
+    if r.status_code not in (200, 302):
+        raise RuntimeError(f"login as {email} failed: {r.status_code}")
+
+
+# picks the ids the cases need straight from the dataset
+def fixtures(db):
+    from sqlalchemy import func, text
+    from web.models import BookingRecord, Flight, User
+
+    now = datetime.utcnow()
+    busiest = (
+        db.session.query(BookingRecord.user_id)
+        .filter(BookingRecord.user_id.isnot(None))
+        .group_by(BookingRecord.user_id)
+        .order_by(func.count().desc())
+        .first()
+    )
+    user = db.session.get(User, busiest[0]) if busiest else None
+    # a search that has results: the first upcoming departure's route, tomorrow
+    upcoming = db.session.query(Flight).filter(Flight.depart_time > now + timedelta(days=1)).order_by(Flight.depart_time).first()
+    # the upcoming flight with the most sold seats for the seat map, and one with room for checkout
+    seat_flight = db.session.execute(text(
+        "SELECT f.id FROM flight f JOIN seat_assignment s ON s.flight_id = f.id "
+        "WHERE f.depart_time > :now GROUP BY f.id ORDER BY COUNT(*) DESC LIMIT 1"
+    ), {"now": now}).scalar()
+    checkout = db.session.execute(text(
+        "SELECT f.id FROM flight f LEFT JOIN seat_assignment s ON s.flight_id = f.id "
+        "WHERE f.depart_time > :now GROUP BY f.id ORDER BY COUNT(s.id), f.id LIMIT 1"
+    ), {"now": now}).scalar()
+    return {
+        "user_email": user.email if user else None,
+        "search": (upcoming.origin, upcoming.destination, upcoming.depart_time.date().isoformat()) if upcoming else None,
+        "seat_flight": seat_flight,
+        "checkout_flight": checkout,
+    }
+
+
+# free seats on the checkout flight, handed out one per checkout request
+def free_seats(flight_id: int):
+    from web import db
+    from web.models import Flight
+    from web.seat_allocation import blocked_seats, occupied_seats
+    from web.seat_inventory import seat_codes
+
+    flight = db.session.get(Flight, flight_id)
+    taken = set(occupied_seats(flight_id)) | set(blocked_seats(flight))
+    return iter([c for c in seat_codes(flight.aircraft_type) if c not in taken])
+
+
+# cases the dataset can't support are left out with a warning, so a run never quietly measures less
+def cases(fx):
+    out, skipped = [], []
+    if fx["search"]:
+        origin, dest, day = fx["search"]
+        out.append(("search", "anon", "GET", f"/search?origin={origin}&destination={dest}&depart={day}"))
+    else:
+        skipped.append(("search", "no flight departs after tomorrow"))
+    if fx["seat_flight"]:
+        out.append(("seat_map", "anon", "GET", f"/api/flights/{fx['seat_flight']}/seats"))
+    else:
+        skipped.append(("seat_map", "no upcoming flight has sold seats"))
+    if not fx["user_email"]:
+        skipped.extend((name, "no registered user has bookings") for name in ("checkout", "my_bookings", "account"))
+    else:
+        if fx["checkout_flight"]:
+            out.append(("checkout", "user", "POST", "/payments/submit-card"))
+        else:
+            skipped.append(("checkout", "no upcoming flights"))
+        out.append(("my_bookings", "user", "GET", "/bookings/"))
+        out.append(("account", "user", "GET", "/account"))
+    out.append(("staff_dashboard", "staff", "GET", "/staff/dashboard"))
+    out.append(("staff_report_csv", "staff", "GET", "/staff/download-today-report"))
+    out.append(("staff_manifest_csv", "staff", "GET", "/staff/download-today-manifest"))
+    return out, skipped
+
+
+def checkout_form(flight_id: int, seats):
+    from web.idempotency import new_key
+    seat = next(seats)
+    payload = {"pax": 1, "passengers": [{
+        "fullName": "Bench Mark", "seatCode": seat, "email": "bench@load.test", "classPreference": "",
+    }]}
+    return {
+        "flight_id": flight_id,
+        "seat_data": json.dumps(payload),
+        "country": "Canada",
+        "idempotency_key": new_key(),
+    }
+
+
+def measure(db_path: str, iterations: int, warmup: int):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("OUTBOX_TRANSPORT", "fake")
+    from web import create_app, db
+
+    app = create_app()
+    app.config["TESTING"] = True
+    results = []
+    # fixtures come from their own app context, which is popped before measuring: with a context
+    # pushed, every test-client request would reuse its session and identity map, so queries would be
+    # undercounted and objects loaded by earlier iterations would skew time and memory
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+        fx = fixtures(db)
+        seats = free_seats(fx["checkout_flight"]) if fx["checkout_flight"] else None
+        db.session.remove()
+
+    selected, skipped = cases(fx)
+    for name, reason in skipped:
+        print(f"  WARNING: skipping {name}: {reason}", flush=True)
+
+    client = app.test_client()
+    role = None
+    for name, who, method, path in selected:
+        if who != role:
+            if who == "anon":
+                client.get("/auth/logout")
+            else:
+                login(client, STAFF_EMAIL if who == "staff" else fx["user_email"])
+            role = who
+
+        def call():
+            if name == "checkout":
+                r = client.post(path, data=checkout_form(fx["checkout_flight"], seats))
+            else:
+                r = client.get(path)
+            r.get_data()  # drain streamed bodies (csv downloads) inside the timing
+            r.close()
+            return r.status_code
+
+        for _ in range(warmup):
+            call()
+
+        latencies, queries, statuses = [], [], set()
+        for _ in range(iterations):
+            before = counter.count
+            started = time.perf_counter()
+            statuses.add(call())
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count - before)
+
+        unexpected = sorted(code for code in statuses if not 200 <= code < 400)
+        if unexpected:
+            print(f"  WARNING: {name} answered {', '.join(map(str, unexpected))}", flush=True)
+
+        tracemalloc.start()
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results.append({
+            "endpoint": name,
+            "method": method,
+            "path": path,
+            "status": sorted(statuses),
+            "iterations": iterations,
+            "latency_ms": summarize(latencies),
+            "queries": {"min": min(queries), "max": max(queries), "mean": round(sum(queries) / len(queries), 2)},
+            "peak_kb": round(peak / 1024, 1),
+        })
+        print(f"  {name:<20} p50 {results[-1]['latency_ms']['p50']:>9.2f} ms  "
+              f"p99 {results[-1]['latency_ms']['p99']:>9.2f} ms  "
+              f"{results[-1]['queries']['mean']:>7g} queries  {results[-1]['peak_kb']:>9.1f} KiB", flush=True)
+    return results
+
+
+def dataset_counts(db_path: Path):
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("flight", "booking_record", "booking", "customer", "user")
+        }
+    finally:
+        conn.close()
+
+
+# ---- driver ----
+
+def scale_label(scale) -> str:
+    return f"{scale:g}x" if scale is not None else "db"
+
+
+def failed(result) -> bool:
+    return any(not 200 <= code < 400 for code in result["status"])
+
+
+def compare(current, baseline_path: Path):
+    baseline = json.loads(baseline_path.read_text())
+    old = {(r["scale"], r["endpoint"]): r for r in baseline["results"]}
+    print(f"\ncompared with {baseline_path.name} ({baseline.get('commit') or 'unknown commit'})")
+    for r in current["results"]:
+        prev = old.get((r["scale"], r["endpoint"]))
+        if not prev:
+            continue
+        ratio = r["latency_ms"]["p50"] / prev["latency_ms"]["p50"] if prev["latency_ms"]["p50"] else 0
+        dq = r["queries"]["mean"] - prev["queries"]["mean"]
+        flag = "  <-- slower" if ratio > 1.2 else ""
+        print(f"  {scale_label(r['scale']):>6} {r['endpoint']:<20} p50 x{ratio:5.2f}  queries {dq:+g}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's endpoints across dataset sizes.")
+    parser.add_argument("--scales", default="1,10", help="comma separated dataset scales (default: 1,10)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--db", help="benchmark this database instead of generated ones (it is copied first)")
+    parser.add_argument("--output", type=Path, help="where to write the json results")
+    parser.add_argument("--compare", type=Path, help="earlier results to compare against")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    # child process: measure one database and print the results as json on the last line
+    if args.worker:
+        print(json.dumps(measure(args.db, args.iterations, args.warmup)))
+        return
+
+    now = datetime.now(UTC).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    if args.db:
+        targets = [(None, Path(args.db))]
+    else:
+        targets = [(float(s), None) for s in args.scales.split(",") if s.strip()]
+
+    run = {
+        "commit": git_commit(),
+        "started": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "iterations": args.iterations,
+        "datasets": [],
+        "results": [],
+    }
+    for scale, path in targets:
+        path = path or ensure_dataset(scale, args.seed, now)
+        label = scale_label(scale) if scale is not None else path.name
+        print(f"{label}: {path.name}", flush=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            scratch = Path(tmp) / "bench.sqlite3"
+            shutil.copy(path, scratch)
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "--worker", "--db", str(scratch),
+                 "--iterations", str(args.iterations), "--warmup", str(args.warmup)],
+                cwd=ROOT, env={**os.environ, "PYTHONPATH": str(ROOT)}, stdout=subprocess.PIPE, text=True,
+            )
+            lines = proc.stdout.rstrip().splitlines()
+            for line in lines[:-1]:
+                print(line)
+            if proc.returncode != 0 or not lines:
+                raise SystemExit(f"benchmark run for {label} failed")
+            results = json.loads(lines[-1])
+        run["datasets"].append({"scale": scale, "file": path.name, "rows": dataset_counts(path)})
+        run["results"].extend({"scale": scale, **r} for r in results)
+
+    out = args.output or RESULTS_DIR / f"{now:%Y%m%d-%H%M}-{run['commit'] or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(run, indent=2, sort_keys=True) + "\n")
+    print(f"\nresults written to {out}")
+    if args.compare:
+        compare(run, args.compare)
+
+    # timings of error responses aren't comparable, so a run with any is reported as failed
+    bad = [f"{scale_label(r['scale'])} {r['endpoint']} {r['status']}" for r in run["results"] if failed(r)]
+    if bad:
+        raise SystemExit("endpoints answered with errors: " + "; ".join(bad))
+
+
+if __name__ == "__main__":
+    main()
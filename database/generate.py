@@ -0,0 +1,399 @@
+import argparse
+import hashlib
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import func, select, text
+
+from web import create_app, db
+from web.models import (
+    AircraftType, Booking, BookingRecord, CabinInventory, Customer, Flight, SeatAssignment, SeatMap, User,
+)
+from web.booking_refs import (
+    CODE_LENGTH, EPOCH_MS, MAX_WORKER, PREFIX, SEQUENCE_BITS, WORKER_BITS, SnowflakeGenerator, decode,
+)
+from web.customer_search import FTS_TABLE, fts_available
+from web.fares import BAG_CENTS, UPGRADE_CENTS, tax_rate_for
+from web.seat_inventory import cabin_capacity, cabin_for_row, default_blocked, encode_seats, seat_codes
+from web.seat_pricing import fare_bucket, seat_matrix, seat_positions
+from database.seed import (
+    bulk_load, cents, ensure_aircraft_types, ensure_schema, insert_rows, pick_aircraft_code, stable_noise,
+)
+
+# synthetic data for load testing.
+# everything is derived from --seed: the airport network, the schedule, customers, registered users
+# and bookings (with their seats, staff bookings, customer index rows and cabin counters), so the
+# same arguments always build the same database. flights are generated and written in chunks of
+# CHUNK_FLIGHTS together with their bookings, so memory stays flat however large the dataset is.
+# --scale multiplies days, customers and users, e.g. --scale 10 / --scale 100 for bigger datasets.
+#
+#   python -m database.generate --db sqlite:///load-10x.sqlite3 --scale 10
+#
+# registered users are user{n}@load.test and the staff account is STAFF_EMAIL, all with PASSWORD.
+
+CHUNK_FLIGHTS = 2000
+PASSWORD = "Passw0rd!"
+STAFF_EMAIL = "loadtest@skywing.com"
+FIRST_HOUR, LAST_HOUR = 6, 22
+
+AIRPORTS = [
+    "YYZ", "JFK", "LAX", "SFO", "ORD", "MIA", "SEA", "YVR", "YUL", "YYC", "YOW", "EWR",
+    "LGA", "ATL", "DFW", "BOS", "RDU", "LHR", "CDG", "AMS", "HND", "NRT", "DXB", "FRA",
+    "MAD", "FCO", "DEN", "PHX", "IAH", "MSP", "DTW", "PHL", "CLT", "MCO", "LAS", "SAN",
+]
+
+FIRST_NAMES = [
+    "Amina", "Layla", "Omar", "Yusuf", "Fatima", "Maryam", "Noor", "Ibrahim", "Zain", "Hassan",
+    "Bilal", "Ayesha", "Sana", "Imran", "Ali", "Sara", "John", "Michael", "Emily", "Sophia",
+    "Olivia", "James", "Liam", "Noah", "Emma", "Ava", "Ethan", "Mason", "Luca", "Mateo",
+]
+LAST_NAMES = [
+    "Khan", "Hussain", "Abdullah", "Rahman", "Patel", "Siddiqui", "Sheikh", "Qureshi", "Smith", "Brown",
+    "Anderson", "Miller", "Garcia", "Martinez", "Taylor", "Ivanov", "Novak", "Silva", "Costa", "Rossi",
+]
+MEALS = ["Standard", "Standard", "Standard", "Vegetarian", "Halal", "Kosher"]
+
+
+@dataclass
+class Params:
+    seed: int = 1
+    airports: int = 16
+    routes_per_airport: int = 3
+    days: int = 22
+    past_days: int = 7
+    frequency: int = 5
+    customers: int = 2000
+    users: int = 200
+    booking_density: float = 0.1
+    seat_fill: float = 0.25
+    user_share: float = 0.3
+    max_party: int = 4
+
+    def scaled(self, scale: float) -> "Params":
+        p = Params(**{f.name: getattr(self, f.name) for f in fields(self)})
+        p.days = max(1, round(self.days * scale))
+        p.customers = max(1, round(self.customers * scale))
+        p.users = max(0, round(self.users * scale))
+        return p
+
+
+def airport_codes(n: int):
+    codes = AIRPORTS[:n]
+    i = 0
+    while len(codes) < n:
+        # made-up codes past the real list: QAA, QAB, ...
+        codes.append("Q" + chr(65 + i // 26 % 26) + chr(65 + i % 26))
+        i += 1
+    return codes
+
+
+# a random connected network: every airport gets routes_per_airport outbound routes (plus the way back).
+# base fares grow with the distance between made-up airport coordinates, from $90 to about $1000.
+def build_routes(params: Params, rng: random.Random):
+    codes = airport_codes(params.airports)
+    where = {c: (rng.uniform(0, 100), rng.uniform(0, 100)) for c in codes}
+    pairs = set()
+    for i, origin in enumerate(codes):
+        # a chain through every airport keeps the network connected
+        if i:
+            pairs.add((codes[i - 1], origin))
+        others = [c for c in codes if c != origin]
+        for dest in rng.sample(others, min(params.routes_per_airport, len(others))):
+            pairs.add((origin, dest))
+    pairs |= {(d, o) for o, d in pairs}
+
+    routes = []
+    for origin, dest in sorted(pairs):
+        (x1, y1), (x2, y2) = where[origin], where[dest]
+        base = 90 + 6.5 * math.hypot(x1 - x2, y1 - y2)
+        routes.append((origin, dest, round(base)))
+    return routes
+
+
+def slot_times(frequency: int):
+    span = (LAST_HOUR - FIRST_HOUR) * 60
+    step = span / max(frequency, 1)
+    return [timedelta(hours=FIRST_HOUR, minutes=round(step * i + step / 2)) for i in range(frequency)]
+
+
+def schedule(params: Params, routes, start: datetime):
+    slots = slot_times(params.frequency)
+    for day in range(params.days):
+        for origin, dest, base in routes:
+            for idx, t_off in enumerate(slots):
+                depart = start + timedelta(days=day) + t_off
+                peak = 0.07 if 15 * 60 <= t_off.total_seconds() / 60 <= 19 * 60 else -0.03
+                weekend = 0.08 if depart.weekday() in (4, 5) else 0.0
+                noise = stable_noise(f"{params.seed}-{origin}-{dest}-{depart.isoformat()}")
+                yield origin, dest, depart, cents(max(60, base * (1 + peak + weekend + noise)))
+
+
+def _next_id(conn, column) -> int:
+    return (conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+# werkzeug's scrypt hash format with a salt derived from the seed (generate_password_hash salts randomly)
+def _password_hash(params: Params) -> str:
+    salt = hashlib.sha256(f"load-test-{params.seed}".encode()).hexdigest()[:16]
+    n, r, p = 32768, 8, 1
+    digest = hashlib.scrypt(PASSWORD.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=132 * n * r * p)
+    return f"scrypt:{n}:{r}:{p}${salt}${digest.hex()}"
+
+
+# first millisecond for generated booking refs: the seed on an empty database, otherwise just past
+# the newest snowflake ref already stored, so a second run appends refs instead of repeating them
+def _ref_clock_start(conn, params: Params) -> int:
+    latest = conn.execute(
+        select(func.max(BookingRecord.booking_ref)).where(
+            BookingRecord.booking_ref.like(f"{PREFIX}%"),
+            func.length(BookingRecord.booking_ref) == len(PREFIX) + CODE_LENGTH,
+        )
+    ).scalar()
+    start = params.seed
+    if latest:
+        try:
+            start = max(start, (decode(latest[len(PREFIX):]) >> (WORKER_BITS + SEQUENCE_BITS)) + 1)
+        except ValueError:
+            pass
+    return EPOCH_MS + start
+
+
+def generate_users(conn, params: Params):
+    first_id = _next_id(conn, User.id)
+    password_hash = _password_hash(params)
+    rows = [
+        {"id": first_id + i, "email": f"user{first_id + i}@load.test", "password_hash": password_hash}
+        for i in range(params.users)
+    ]
+    insert_rows(conn, User.__table__, rows)
+    if not conn.execute(select(User.id).where(User.email == STAFF_EMAIL)).first():
+        insert_rows(conn, User.__table__, [{"email": STAFF_EMAIL, "password_hash": password_hash}])
+    return [(r["id"], r["email"]) for r in rows]
+
+
+def generate_customers(conn, params: Params, rng: random.Random):
+    first_id = _next_id(conn, Customer.id)
+    rows = []
+    for i in range(params.customers):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append({
+            "id": first_id + i,
+            "first_name": first,
+            "last_name": last,
+            "email": f"{first.lower()}.{last.lower()}{first_id + i}@load.test",
+            "phone": f"647-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        })
+    insert_rows(conn, Customer.__table__, rows)
+    return [
+        (r["id"], r["first_name"], r["last_name"], r["email"], r["phone"], "".join(ch for ch in r["phone"] if ch.isdigit()))
+        for r in rows
+    ]
+
+
+# per aircraft type, worked out once: sellable seats with their cabin / position / seat fee
+class Plane:
+    def __init__(self, atype):
+        self.atype = atype
+        self.blocked = default_blocked(atype)
+        self.blocked_bits = encode_seats(atype, self.blocked)
+        self.capacity = cabin_capacity(atype, self.blocked)
+        position = {ch: kind.capitalize() for ch, kind in seat_positions(atype.layout).items()}
+        blocked = set(self.blocked)
+        self.seats = [
+            (code, cabin_for_row(int(code[:-1]), atype.class_map), position[code[-1]])
+            for code in seat_codes(atype) if code not in blocked
+        ]
+        self._fees = {}
+
+    def fees(self, price_cents: int):
+        bucket = fare_bucket(price_cents)
+        if bucket not in self._fees:
+            self._fees[bucket] = seat_matrix(self.atype, bucket).fees
+        return self._fees[bucket]
+
+
+class Writer:
+    def __init__(self, conn):
+        self.conn = conn
+        self.booking_id = _next_id(conn, Booking.id)
+        self.record_id = _next_id(conn, BookingRecord.id)
+        self.tables = {}
+        self.counts = {}
+
+    def add(self, table, row):
+        self.tables.setdefault(table, []).append(row)
+
+    def flush(self):
+        for table, rows in self.tables.items():
+            if table == FTS_TABLE:
+                self.conn.execute(text(
+                    f"INSERT INTO {FTS_TABLE} (rowid, first_name, last_name, email, phone, booking_ref) "
+                    "VALUES (:id, :first, :last, :email, :phone, :refs)"
+                ), rows)
+                name = FTS_TABLE
+            else:
+                insert_rows(self.conn, table, rows)
+                name = table.name
+            self.counts[name] = self.counts.get(name, 0) + len(rows)
+        self.tables = {}
+        self.conn.commit()
+
+
+# fills seat_fill of a flight's sellable seats with parties of 1..max_party, the way checkout would
+def book_flight(w: Writer, params, rng, plane: Plane, flight: dict, now, customers, users, refs):
+    sold = rng.sample(plane.seats, round(len(plane.seats) * params.seat_fill))
+    rng.shuffle(sold)
+    fees = plane.fees(flight["price_cents"])
+    departed = flight["depart_time"] <= now
+    tax_rate = tax_rate_for("Canada")
+    cabins = {}
+
+    i = 0
+    while i < len(sold):
+        party = sold[i:i + rng.randint(1, params.max_party)]
+        i += len(party)
+        cust_id, first, last, cust_email, phone, digits = rng.choice(customers)
+        user = rng.choice(users) if users and rng.random() < params.user_share else None
+        email = user[1] if user else cust_email
+        created_at = flight["depart_time"] - timedelta(days=rng.uniform(1, 60), minutes=rng.randint(0, 1439))
+        booking_ref = refs.next_ref()
+
+        passengers = []
+        subtotal = 0
+        for n, (code, cabin, position) in enumerate(party):
+            bags = 1 if rng.random() < 0.2 else 0
+            passengers.append({
+                "label": f"Passenger {n + 1}",
+                "fullName": f"{first} {last}" if n == 0 else f"{rng.choice(FIRST_NAMES)} {last}",
+                "seatCode": code,
+                "cabin": cabin,
+                "position": position,
+                "seatPreference": position,
+                "mealPreference": rng.choice(MEALS),
+                "classPreference": cabin,
+                "extraBags": bags,
+                "email": email if n == 0 else "",
+                "phone": phone if n == 0 else "",
+                "row": int(code[:-1]),
+                "letter": code[-1],
+            })
+            subtotal += flight["price_cents"] + UPGRADE_CENTS.get(cabin.lower(), 0) + bags * BAG_CENTS + fees.get(code, 0)
+            cabins[cabin] = cabins.get(cabin, 0) + 1
+
+            w.add(SeatAssignment.__table__, {
+                "flight_id": flight["id"], "seat_code": code, "booking_ref": booking_ref, "created_at": created_at,
+            })
+            w.add(Booking.__table__, {
+                "id": w.booking_id, "customer_id": cust_id, "flight_id": flight["id"],
+                "seat_code": code, "booking_ref": booking_ref, "created_at": created_at,
+            })
+            w.add(FTS_TABLE, {
+                "id": w.booking_id, "first": first, "last": last, "email": cust_email,
+                "phone": digits, "refs": f"BK-{w.booking_id:06d} {booking_ref}",
+            })
+            w.booking_id += 1
+
+        w.add(BookingRecord.__table__, {
+            "id": w.record_id,
+            "user_id": user[0] if user else None,
+            "booking_ref": booking_ref,
+            "flight_id": flight["id"],
+            "primary_name": f"{first} {last}",
+            "primary_email": email,
+            "primary_phone": phone,
+            "total_paid_cents": subtotal + round(subtotal * tax_rate),
+            "status": "Departed" if departed else "On time",
+            "passengers": passengers,
+            "created_at": created_at,
+        })
+        w.record_id += 1
+
+    for cabin, capacity in plane.capacity.items():
+        w.add(CabinInventory.__table__, {
+            "flight_id": flight["id"], "cabin": cabin, "capacity": capacity, "sold": cabins.get(cabin, 0),
+        })
+
+
+# now anchors the schedule (flights start past_days before it); pass the same now for identical output
+def generate(params: Params, now: datetime | None = None):
+    now = now or datetime.now(UTC).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    rng = random.Random(params.seed)
+    start = now.replace(hour=0) - timedelta(days=params.past_days)
+
+    ensure_schema()
+    ensure_aircraft_types()
+    planes = {a.code: Plane(a) for a in AircraftType.query.all()}
+    db.session.commit()
+    if not fts_available():
+        raise SystemExit("the generator writes the sqlite customer index and needs a sqlite database")
+
+    routes = build_routes(params, rng)
+    with bulk_load() as conn:
+        users = generate_users(conn, params)
+        customers = generate_customers(conn, params, rng)
+        conn.commit()
+
+        w = Writer(conn)
+        # booking refs keep the snowflake layout on a fixed clock, so they are deterministic too
+        ref_clock = _ref_clock_start(conn, params)
+        refs = SnowflakeGenerator(worker_id=MAX_WORKER, clock=lambda: ref_clock)
+        flight_id = _next_id(conn, Flight.id)
+        flights = 0
+        for origin, dest, depart, price_cents in schedule(params, routes, start):
+            plane = planes[pick_aircraft_code(price_cents)]
+            flight = {
+                "id": flight_id,
+                "origin": origin,
+                "destination": dest,
+                "depart_time": depart,
+                "price_cents": price_cents,
+                "status": "On time",
+                "aircraft_type_id": plane.atype.id,
+            }
+            w.add(Flight.__table__, flight)
+            w.add(SeatMap.__table__, {
+                "flight_id": flight_id, "aircraft_type_id": plane.atype.id, "blocked": plane.blocked_bits,
+            })
+            # each flight draws from its own stream, so one knob doesn't reshuffle every other flight
+            flight_rng = random.Random(params.seed * 1_000_003 + flights)
+            if customers and flight_rng.random() < params.booking_density:
+                book_flight(w, params, flight_rng, plane, flight, now, customers, users, refs)
+            flight_id += 1
+            flights += 1
+            if flights % CHUNK_FLIGHTS == 0:
+                w.flush()
+        w.flush()
+
+    counts = {"routes": len(routes), "users": len(users), "customers": len(customers), **w.counts}
+    return counts
+
+
+def main(argv=None):
+    defaults = Params()
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic dataset for load testing.")
+    parser.add_argument("--db", help="database url (default: DATABASE_URL / the app default)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies days, customers and users")
+    parser.add_argument("--now", type=datetime.fromisoformat,
+                        help="utc time the schedule is anchored on, e.g. 2026-01-01T00:00 (default: the current hour)")
+    for f in fields(Params):
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=type(getattr(defaults, f.name)),
+                            default=getattr(defaults, f.name))
+    args = parser.parse_args(argv)
+    params = Params(**{f.name: getattr(args, f.name) for f in fields(Params)}).scaled(args.scale)
+
+    if args.db:
+        os.environ["DATABASE_URL"] = args.db
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        counts = generate(params, args.now)
+        summary = ", ".join(f"{v} {k}" for k, v in counts.items())
+        print(f"Generated {summary} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,95 @@
-from datetime import datetime, timedelta, UTC
+import argparse
 import hashlib
-from sqlalchemy import text
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import case, insert, select, text, update
 from web import create_app, db
-from web.models import Flight, AircraftType, Seat
+from web.models import Flight, AircraftType, SeatMap
+from web.seat_inventory import encode_seats, default_blocked
+
+# seeds flights, aircraft types and seat maps.
+# flights are generated route by route on a process pool and written with core executemany inserts
+# on one connection, with sqlite's fsync and rollback journal relaxed for the duration of the load.
+# aircraft assignment and "which flights still need a seat map" are single set-based statements,
+# so a full seed (or a re-run that finds nothing to do) takes a few seconds.
+
+CHUNK = 5000
+
+ROUTES = [
+    ("YYZ","JFK",220), ("JFK","YYZ",215),
+    ("YYZ","EWR",215), ("EWR","YYZ",210),
+    ("YYZ","LGA",215), ("LGA","YYZ",210),
+    ("YYZ","LAX",420), ("LAX","YYZ",415),
+    ("YYZ","SFO",410), ("SFO","YYZ",405),
+    ("YYZ","SEA",360), ("SEA","YYZ",355),
+    ("YYZ","YVR",360), ("YVR","YYZ",355),
+    ("YYZ","YYC",240), ("YYC","YYZ",235),
+    ("YYZ","YUL",140), ("YUL","YYZ",140),
+    ("YYZ","YOW",120), ("YOW","YYZ",120),
+    ("YYZ","ORD",230), ("ORD","YYZ",225),
+    ("YYZ","MIA",310), ("MIA","YYZ",305),
+    ("YYZ","ATL",260), ("ATL","YYZ",255),
+    ("YYZ","DFW",300), ("DFW","YYZ",295),
+    ("YYZ","BOS",200), ("BOS","YYZ",195),
+    ("YYZ","RDU",350), ("RDU","YYZ",345),
+
+    ("JFK","LAX",280), ("LAX","JFK",285),
+    ("JFK","SFO",300), ("SFO","JFK",305),
+    ("JFK","MIA",170), ("MIA","JFK",175),
+    ("JFK","ORD",160), ("ORD","JFK",160),
+    ("LAX","SFO",120), ("SFO","LAX",120),
+    ("SEA","SFO",140), ("SFO","SEA",140),
+    ("SEA","LAX",170), ("LAX","SEA",170),
+    ("ORD","LAX",260), ("LAX","ORD",260),
+    ("DFW","LAX",210), ("LAX","DFW",210),
+
+    ("YYZ","LHR",650), ("LHR","YYZ",640),
+    ("YYZ","CDG",620), ("CDG","YYZ",615),
+    ("YYZ","AMS",610), ("AMS","YYZ",605),
+    ("JFK","LHR",600), ("LHR","JFK",600),
+    ("JFK","CDG",580), ("CDG","JFK",580),
+
+    ("YYZ","HND",900), ("HND","YYZ",890),
+    ("YYZ","NRT",890), ("NRT","YYZ",880),
+    ("JFK","HND",950), ("HND","JFK",945),
+    ("LAX","HND",820), ("HND","LAX",815),
+
+    ("YYZ","DXB",920), ("DXB","YYZ",910),
+    ("JFK","DXB",880), ("DXB","JFK",875),
+
+    ("LHR","CDG",120), ("CDG","LHR",120),
+    ("LHR","AMS",130), ("AMS","LHR",130),
+    ("CDG","AMS",110), ("AMS","CDG",110),
+
+    ("YVR","YYC",150), ("YYC","YVR",150),
+    ("YVR","YUL",360), ("YUL","YVR",360),
+    ("YUL","YOW",110), ("YOW","YUL",110),
+]
 
-app = create_app()
+# how long into the future the database seeds flights for (22)
+DAY_OFFSETS = list(range(0, 22))
+TIME_OFFSETS = [
+    timedelta(hours=6, minutes=30),
+    timedelta(hours=9, minutes=45),
+    timedelta(hours=13, minutes=15),
+    timedelta(hours=18, minutes=30),
+    timedelta(hours=21, minutes=0),
+]
+SLOT_MULT = {0: -0.06, 1: -0.02, 2: +0.00, 3: +0.07, 4: +0.03}
+
+# aircraft by ticket price (cents, checked top down): higher priced flights use larger/more premium planes
+AIRCRAFT_BY_PRICE = ((60000, "A380"), (30000, "B747"), (0, "A320"))
 
 # this makes sure the required tables and columns actually exist.
-# - creates AircraftType and Seat tables if they're missing.
+# - creates AircraftType and SeatMap tables if they're missing.
 # - checks the flight table and adds aircraft_type_id if it isn't there.
 def ensure_schema():
     AircraftType.__table__.create(bind=db.engine, checkfirst=True)
-    Seat.__table__.create(bind=db.engine, checkfirst=True)
+    SeatMap.__table__.create(bind=db.engine, checkfirst=True)
 
     cols = db.session.execute(text("PRAGMA table_info('flight')")).fetchall()
     colnames = {row[1] for row in cols}
@@ -68,193 +146,184 @@ def ensure_aircraft_types():
         db.session.commit()
 
 # chooses which aircraft type to use based on ticket price.
-# higher priced flights use larger/more premium planes.
 def pick_aircraft_code(price_cents: int) -> str:
-    p = (price_cents or 0) / 100.0
-    if p >= 600:
-        return "A380"
-    if p >= 300:
-        return "B747"
-    return "A320"
-
-# helps generate seat order for each row.
-def letters_from_layout(layout_str: str):
-    letters = []
-    for group in layout_str.split():
-        letters.extend(list(group))
-    return letters
-
-# figures out which cabin/class a given row belongs to based on the aircraft's class_map.
-def cabin_for_row(row: int, class_map):
-    for block in class_map:
-        if block["from"] <= row <= block["to"]:
-            return block["class"]
-    return "Economy"
-
-# Assigns aircraft types to flights that don't have one.
-# Then generates seats for every flight that doesn’t already have seats.
-# Seats are created using the aircraft’s row count, seat letters, and cabin class map.
-def attach_aircraft_to_flights_and_seed_seats():
-    atypes = {a.code: a for a in AircraftType.query.all()}
-    flights = Flight.query.all()
-    touched = 0
-    for f in flights:
-        if f.aircraft_type_id is None:
-            f.aircraft_type_id = atypes[pick_aircraft_code(f.price_cents)].id
-            touched += 1
-    if touched:
-        db.session.commit()
-
-    atypes_by_id = {a.id: a for a in AircraftType.query.all()}
-    total_new = 0
+    for floor, code in AIRCRAFT_BY_PRICE:
+        if (price_cents or 0) >= floor:
+            return code
+    return AIRCRAFT_BY_PRICE[-1][1]
 
-    for f in flights:
-        if not f.aircraft_type_id:
-            continue
 
-        exists = db.session.query(Seat.id).filter_by(flight_id=f.id).limit(1).first()
-        if exists:
+# weekend price bump
+def weekend_bump(dt):
+    return 0.08 if dt.weekday() in (4, 5) else 0.0
+
+
+# every flight for one route as insert-ready dicts.
+# price is base_price × (slot multiplier + weekend bump + small deterministic noise).
+# runs in a worker process, so it only touches plain data.
+def route_flights(route, now, atype_ids):
+    origin, dest, base = route
+    rows = []
+    for d in DAY_OFFSETS:
+        for idx, t_off in enumerate(TIME_OFFSETS):
+            depart = now + timedelta(days=d) + t_off
+            price = base * (1 + SLOT_MULT[idx] + weekend_bump(depart))
+            # noise is keyed on the tz-aware timestamp so prices match earlier seeds
+            noise = stable_noise(f"{origin}-{dest}-{depart.replace(tzinfo=UTC).isoformat()}")
+            price_cents = cents(max(60, price * (1 + noise)))
+            rows.append({
+                "origin": origin,
+                "destination": dest,
+                "depart_time": depart,
+                "price_cents": price_cents,
+                "status": "On time",
+                "aircraft_type_id": atype_ids[pick_aircraft_code(price_cents)],
+            })
+    return rows
+
+
+def generate_flights(now, atype_ids, workers: int):
+    if workers <= 1:
+        return [row for route in ROUTES for row in route_flights(route, now, atype_ids)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = pool.map(route_flights, ROUTES, [now] * len(ROUTES), [atype_ids] * len(ROUTES))
+        return [row for rows in chunks for row in rows]
+
+
+# one connection for the whole load with fsync off and the rollback journal in memory.
+# a crash mid-seed can leave a damaged file, which is fine for a seed run; the previous
+# settings are put back before the connection returns to the pool.
+@contextmanager
+def bulk_load():
+    with db.engine.connect() as conn:
+        synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        conn.exec_driver_sql("PRAGMA journal_mode=MEMORY")
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql(f"PRAGMA journal_mode={journal_mode}")
+            conn.exec_driver_sql(f"PRAGMA synchronous={synchronous}")
+
+
+def insert_rows(conn, table, rows):
+    for i in range(0, len(rows), CHUNK):
+        conn.execute(insert(table), rows[i:i + CHUNK])
+
+
+# new flights for every route × day × time slot that isn't in the database yet
+def seed_flights(conn, now, atype_ids, workers: int) -> int:
+    now_min = now + timedelta(days=min(DAY_OFFSETS)) + min(TIME_OFFSETS)
+    now_max = now + timedelta(days=max(DAY_OFFSETS)) + max(TIME_OFFSETS)
+    existing = set(conn.execute(
+        select(Flight.origin, Flight.destination, Flight.depart_time)
+        .where(Flight.depart_time >= now_min, Flight.depart_time <= now_max)
+    ).tuples())
+
+    rows = []
+    for row in generate_flights(now, atype_ids, workers):
+        key = (row["origin"], row["destination"], row["depart_time"])
+        if key in existing:
             continue
+        existing.add(key)
+        rows.append(row)
+
+    insert_rows(conn, Flight.__table__, rows)
+    conn.commit()
+    return len(rows)
+
+
+# databases seeded before seat maps existed have one row per seat in a "seats" table.
+# returns {flight_id: [blocked seat codes]} for those flights so their blocks carry over.
+def legacy_blocked_seats(conn):
+    tables = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='seats'")).fetchall()
+    if not tables:
+        return None
+    legacy = {}
+    for (fid,) in conn.execute(text("SELECT DISTINCT flight_id FROM seats")):
+        legacy[fid] = []
+    rows = conn.execute(text("SELECT flight_id, row_num, seat_letter FROM seats WHERE is_blocked = 1"))
+    for fid, r, ch in rows:
+        legacy.setdefault(fid, []).append(f"{r}{ch}")
+    return legacy
+
+
+# Assigns aircraft types to flights that don't have one (one UPDATE).
+# Then writes a seat map for every flight that doesn't already have one.
+# The seat map is a bitmap over the aircraft's seats (see web/seat_inventory.py), so each flight
+# costs one small row instead of a row per seat. Fresh flights of one aircraft type all get the
+# same default blocks, so they are filled by one INSERT ... SELECT per type.
+def attach_aircraft_to_flights_and_seed_seats(conn) -> int:
+    atypes = {a.code: a for a in AircraftType.query.all()}
+    conn.execute(
+        update(Flight.__table__)
+        .where(Flight.aircraft_type_id.is_(None))
+        .values(aircraft_type_id=case(
+            *[(Flight.price_cents >= floor, atypes[code].id) for floor, code in AIRCRAFT_BY_PRICE],
+            else_=atypes[AIRCRAFT_BY_PRICE[-1][1]].id,
+        ))
+    )
 
-        atype = atypes_by_id[f.aircraft_type_id]
-        letters = letters_from_layout(atype.layout)
-
-        batch = []
-        for r in range(1, atype.total_rows + 1):
-            cab = cabin_for_row(r, atype.class_map)
-            for ch in letters:
-                s = Seat(
-                    flight_id=f.id,
-                    row_num=r,
-                    seat_letter=ch,
-                    cabin_class=cab,
-                    is_blocked=(r == 1 and ch in ("E", "F")),
-                )
-                batch.append(s)
-
-        db.session.bulk_save_objects(batch)
+    missing = (
+        select(Flight.id, Flight.aircraft_type_id)
+        .outerjoin(SeatMap, SeatMap.flight_id == Flight.id)
+        .where(SeatMap.flight_id.is_(None), Flight.aircraft_type_id.isnot(None))
+    )
+    seeded = 0
+
+    # flights carried over from the per-seat table keep their own blocks
+    legacy = legacy_blocked_seats(conn)
+    if legacy is not None:
+        atypes_by_id = {a.id: a for a in atypes.values()}
+        rows = []
+        for fid, type_id in conn.execute(missing.where(Flight.id.in_(list(legacy)))):
+            atype = atypes_by_id.get(type_id)
+            if atype:
+                rows.append({"flight_id": fid, "aircraft_type_id": type_id, "blocked": encode_seats(atype, legacy[fid])})
+        insert_rows(conn, SeatMap.__table__, rows)
+        seeded += len(rows)
+
+    for atype in atypes.values():
+        fresh = missing.where(Flight.aircraft_type_id == atype.id).with_only_columns(
+            Flight.id, Flight.aircraft_type_id, text(":blocked").bindparams(blocked=encode_seats(atype, default_blocked(atype)))
+        )
+        result = conn.execute(
+            insert(SeatMap.__table__).from_select(["flight_id", "aircraft_type_id", "blocked"], fresh)
+        )
+        seeded += result.rowcount or 0
+
+    # the per-seat table is fully replaced by seat maps now
+    if legacy is not None:
+        conn.execute(text("DROP TABLE seats"))
+    conn.commit()
+    return seeded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed flights, aircraft types and seat maps.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes used to generate flight rows (default: one per cpu)")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        ensure_schema()
+        ensure_aircraft_types()
+        atype_ids = {a.code: a.id for a in AircraftType.query.all()}
         db.session.commit()
-        total_new += len(batch)
-
-    print(f"Seeded seats: {total_new}")
-
-
-with app.app_context():
-    ensure_schema()
-
-    now = datetime.now(UTC).replace(minute=0, second=0, microsecond=0)
-
-    routes = [
-        ("YYZ","JFK",220), ("JFK","YYZ",215),
-        ("YYZ","EWR",215), ("EWR","YYZ",210),
-        ("YYZ","LGA",215), ("LGA","YYZ",210),
-        ("YYZ","LAX",420), ("LAX","YYZ",415),
-        ("YYZ","SFO",410), ("SFO","YYZ",405),
-        ("YYZ","SEA",360), ("SEA","YYZ",355),
-        ("YYZ","YVR",360), ("YVR","YYZ",355),
-        ("YYZ","YYC",240), ("YYC","YYZ",235),
-        ("YYZ","YUL",140), ("YUL","YYZ",140),
-        ("YYZ","YOW",120), ("YOW","YYZ",120),
-        ("YYZ","ORD",230), ("ORD","YYZ",225),
-        ("YYZ","MIA",310), ("MIA","YYZ",305),
-        ("YYZ","ATL",260), ("ATL","YYZ",255),
-        ("YYZ","DFW",300), ("DFW","YYZ",295),
-        ("YYZ","BOS",200), ("BOS","YYZ",195),
-        ("YYZ","RDU",350), ("RDU","YYZ",345),
-
-        ("JFK","LAX",280), ("LAX","JFK",285),
-        ("JFK","SFO",300), ("SFO","JFK",305),
-        ("JFK","MIA",170), ("MIA","JFK",175),
-        ("JFK","ORD",160), ("ORD","JFK",160),
-        ("LAX","SFO",120), ("SFO","LAX",120),
-        ("SEA","SFO",140), ("SFO","SEA",140),
-        ("SEA","LAX",170), ("LAX","SEA",170),
-        ("ORD","LAX",260), ("LAX","ORD",260),
-        ("DFW","LAX",210), ("LAX","DFW",210),
-
-        ("YYZ","LHR",650), ("LHR","YYZ",640),
-        ("YYZ","CDG",620), ("CDG","YYZ",615),
-        ("YYZ","AMS",610), ("AMS","YYZ",605),
-        ("JFK","LHR",600), ("LHR","JFK",600),
-        ("JFK","CDG",580), ("CDG","JFK",580),
-
-        ("YYZ","HND",900), ("HND","YYZ",890),
-        ("YYZ","NRT",890), ("NRT","YYZ",880),
-        ("JFK","HND",950), ("HND","JFK",945),
-        ("LAX","HND",820), ("HND","LAX",815),
-
-        ("YYZ","DXB",920), ("DXB","YYZ",910),
-        ("JFK","DXB",880), ("DXB","JFK",875),
-
-        ("LHR","CDG",120), ("CDG","LHR",120),
-        ("LHR","AMS",130), ("AMS","LHR",130),
-        ("CDG","AMS",110), ("AMS","CDG",110),
-
-        ("YVR","YYC",150), ("YYC","YVR",150),
-        ("YVR","YUL",360), ("YUL","YVR",360),
-        ("YUL","YOW",110), ("YOW","YUL",110),
-    ]
-# how long into the future the database seeds flights for (22)
-    day_offsets = list(range(0, 22))
-    time_offsets = [
-        timedelta(hours=6, minutes=30),
-        timedelta(hours=9, minutes=45),
-        timedelta(hours=13, minutes=15),
-        timedelta(hours=18, minutes=30),
-        timedelta(hours=21, minutes=0),
-    ]
 
-    slot_mult = {0: -0.06, 1: -0.02, 2: +0.00, 3: +0.07, 4: +0.03}
+        # depart times are stored as naive utc, so the duplicate check must compare naive values too
+        now = datetime.now(UTC).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+        with bulk_load() as conn:
+            added = seed_flights(conn, now, atype_ids, args.workers)
+            print(f"Seeded {added} flights." if added else "No new flights to seed.")
+            print(f"Seeded seat maps: {attach_aircraft_to_flights_and_seed_seats(conn)}")
+        print(f"Done in {time.perf_counter() - started:.1f}s")
 
-# weekend price bump
-    def weekend_bump(dt):
-        return 0.08 if dt.weekday() in (4, 5) else 0.0
-
-    now_min = now + timedelta(days=min(day_offsets)) + min(time_offsets)
-    now_max = now + timedelta(days=max(day_offsets)) + max(time_offsets)
-
-    existing = set(
-        (f.origin, f.destination, f.depart_time)
-        for f in db.session.query(Flight.origin, Flight.destination, Flight.depart_time)
-        .filter(Flight.depart_time >= now_min,
-                Flight.depart_time <= now_max)
-        .all()
-    )
 
-    to_insert = []
-
-    # Generate new flights for every route × day × time slot combination.
-    # Price is base_price × (slot multiplier + weekend bump + small random noise).
-    for origin, dest, base in routes:
-        for d in day_offsets:
-            for idx, t_off in enumerate(time_offsets):
-                depart = now + timedelta(days=d) + t_off
-                price = base * (1 + slot_mult[idx] + weekend_bump(depart))
-                noise = stable_noise(f"{origin}-{dest}-{depart.isoformat()}")
-                price = max(60, price * (1 + noise))
-
-                key = (origin, dest, depart)
-                if key in existing:
-                    continue
-                existing.add(key)
-
-                to_insert.append(Flight(
-                    origin=origin,
-                    destination=dest,
-                    depart_time=depart,
-                    price_cents=cents(price),
-                ))
-
-# slows down the insertion of flights to avoid large transactions.
-    if to_insert:
-        CHUNK = 1000
-        for i in range(0, len(to_insert), CHUNK):
-            db.session.bulk_save_objects(to_insert[i:i+CHUNK])
-            db.session.commit()
-        print(f"Seeded {len(to_insert)} flights.")
-    else:
-        print("No new flights to seed.")
-
-# last checks
-    ensure_aircraft_types()
-    attach_aircraft_to_flights_and_seed_seats()
+if __name__ == "__main__":
+    main()
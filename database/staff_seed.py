@@ -2,7 +2,11 @@ from datetime import datetime
 import random
 
 from web import create_app, db
-from web.models import User, Customer, Booking, Flight
+from web.models import User, Customer, Booking, Flight, SeatAssignment
+from web.seat_allocation import blocked_seats, occupied_seats
+from web.seat_inventory import seat_codes
+from web.availability import passenger_cabins, reserve
+from web.customer_search import index_bookings
 
 app = create_app()
 
@@ -63,7 +67,7 @@ import random
 
 # creates random bookings for flights happening "today"
 # if there are no flights today, it falls back to the first 50 flights in the DB
-# each booking links a random customer to a random seat, making sure not to double-book a seat
+# each booking links a random customer to a random seat and claims it in seat_assignment, making sure not to double-book a seat
 def seed_bookings():
     customers = Customer.query.all()
     if not customers:
@@ -91,17 +95,21 @@ def seed_bookings():
         num = random.randint(5, 20)
         chosen_customers = random.sample(customers, min(num, len(customers)))
 
-        for cust in chosen_customers:
-            seat_row = random.randint(1, 30)
-            seat_letter = random.choice(["A", "B", "C", "D", "E", "F"])
-            seat_code = f"{seat_row}{seat_letter}"
+        # seats already sold or blocked on this flight, so seeded bookings never double-book
+        taken = set(occupied_seats(fl.id))
+        if fl.aircraft_type:
+            taken.update(blocked_seats(fl))
 
-            existing = Booking.query.filter_by(
-                flight_id=fl.id,
-                seat_code=seat_code
-            ).first()
-            if existing:
-                continue
+        seeded = []
+        new_bookings = []
+        # only real seats on the flight's aircraft
+        free = [c for c in seat_codes(fl.aircraft_type) if c not in taken] if fl.aircraft_type else []
+        random.shuffle(free)
+        for cust in chosen_customers:
+            if not free:
+                break
+            seat_code = free.pop()
+            taken.add(seat_code)
 
             b = Booking(
                 customer_id=cust.id,
@@ -109,7 +117,18 @@ def seed_bookings():
                 seat_code=seat_code,
             )
             db.session.add(b)
+            db.session.add(SeatAssignment(flight_id=fl.id, seat_code=seat_code))
             created += 1
+            seeded.append({"seatCode": seat_code})
+            new_bookings.append((b, cust))
+
+        # booking ids are needed for the staff lookup index
+        db.session.flush()
+        for b, cust in new_bookings:
+            index_bookings([b], cust)
+
+        # keep the cabin availability counters in step with the seeded seats
+        reserve(fl, passenger_cabins(fl, seeded))
 
     db.session.commit()
     print(f"[OK] Seeded {created} bookings for today's (or fallback) flights.")
@@ -1,6 +1,9 @@
 from web import create_app
+from web.jobs import start_background_jobs
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    app.debug = True
+    start_background_jobs(app)
+    app.run()
@@ -3,12 +3,14 @@ from datetime import datetime, date, timedelta
 from flask import Flask, render_template, request, redirect, url_for, flash
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, current_user, login_required
-from sqlalchemy import text, and_, or_
+from sqlalchemy import text
 from dotenv import load_dotenv
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 
+RECENT_BOOKINGS = 5
+
 # load env config, wire up flask, db, login, routes, blueprints, and create tables
 def create_app():
     load_dotenv()
@@ -22,6 +24,28 @@ def create_app():
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret")
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///app.sqlite3")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SEAT_HOLD_MINUTES"] = int(os.getenv("SEAT_HOLD_MINUTES", "10"))
+    app.config["SEARCH_INDEX_MAX_AGE"] = int(os.getenv("SEARCH_INDEX_MAX_AGE", "300"))
+    app.config["STATUS_SWEEP_SECONDS"] = int(os.getenv("STATUS_SWEEP_SECONDS", "60"))
+    app.config["TRIP_STATS_TTL"] = int(os.getenv("TRIP_STATS_TTL", "300"))
+    app.config["IDEMPOTENCY_TTL_HOURS"] = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
+    # notification outbox: OUTBOX_TRANSPORT is "auto" (real providers when keys are set, otherwise messages wait), "live" or "fake"
+    app.config["OUTBOX_TRANSPORT"] = os.getenv("OUTBOX_TRANSPORT", "auto")
+    app.config["OUTBOX_POLL_SECONDS"] = int(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+    app.config["OUTBOX_BATCH"] = int(os.getenv("OUTBOX_BATCH", "100"))
+    app.config["OUTBOX_WORKERS"] = int(os.getenv("OUTBOX_WORKERS", "8"))
+    app.config["OUTBOX_MAX_ATTEMPTS"] = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+    app.config["STATUS_FANOUT_SECONDS"] = int(os.getenv("STATUS_FANOUT_SECONDS", "5"))
+    app.config["STATUS_FANOUT_BATCH"] = int(os.getenv("STATUS_FANOUT_BATCH", "50"))
+    app.config["REMINDER_TICK_SECONDS"] = int(os.getenv("REMINDER_TICK_SECONDS", "30"))
+    # request / sql instrumentation behind /staff/metrics; METRICS_TOKEN lets a scraper read /metrics
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "1") == "1"
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+    app.config["SENDGRID_API_KEY"] = os.getenv("SENDGRID_API_KEY")
+    app.config["TWILIO_SID"] = os.getenv("TWILIO_SID")
+    app.config["TWILIO_TOKEN"] = os.getenv("TWILIO_TOKEN")
+    app.config["TWILIO_PHONE"] = os.getenv("TWILIO_PHONE")
 
     db.init_app(app)
     login_manager.init_app(app)
@@ -34,6 +58,23 @@ def create_app():
             db.session.execute(text("ALTER TABLE booking_record ADD COLUMN user_id INTEGER"))
             db.session.commit()
 
+    # staff-side bookings learned which online booking they mirror; older rows get it from the
+    # customer index, which has stored "BK-<id> <booking ref>" for them all along
+    def ensure_booking_ref_column():
+        cols = db.session.execute(text("PRAGMA table_info('booking')")).fetchall()
+        if "booking_ref" in {row[1] for row in cols}:
+            return
+        db.session.execute(text("ALTER TABLE booking ADD COLUMN booking_ref VARCHAR(32)"))
+        from .customer_search import FTS_TABLE, fts_available
+        if fts_available() and db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}
+        ).first():
+            db.session.execute(text(
+                f"UPDATE booking SET booking_ref = (SELECT substr(f.booking_ref, instr(f.booking_ref, ' ') + 1) "
+                f"FROM {FTS_TABLE} f WHERE f.rowid = booking.id AND instr(f.booking_ref, ' ') > 0)"
+            ))
+        db.session.commit()
+
     def ensure_traveler_columns():
         if not db.engine.url.drivername.startswith("sqlite"):
             return
@@ -63,6 +104,33 @@ def create_app():
         if added:
             db.session.commit()
 
+    # create_all only builds indexes for new tables, so add the ones introduced later to existing databases
+    def ensure_indexes():
+        if not db.engine.url.drivername.startswith("sqlite"):
+            return
+        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_flight_depart_time ON flight (depart_time)"))
+        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_booking_flight_id ON booking (flight_id)"))
+        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_booking_booking_ref ON booking (booking_ref)"))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_booking_record_user_created ON booking_record (user_id, created_at, id)"
+        ))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_booking_record_email_created ON booking_record (primary_email, created_at, id)"
+        ))
+        # flight-less subscribers used to be duplicated per signup; keep the latest one per email
+        has_partial = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'uniq_subscriber_email_no_flight'"
+        )).first()
+        if not has_partial:
+            db.session.execute(text(
+                "DELETE FROM subscriber WHERE flight_id IS NULL AND email IS NOT NULL AND id NOT IN "
+                "(SELECT MAX(id) FROM subscriber WHERE flight_id IS NULL GROUP BY email)"
+            ))
+            db.session.execute(text(
+                "CREATE UNIQUE INDEX uniq_subscriber_email_no_flight ON subscriber (email) WHERE flight_id IS NULL"
+            ))
+        db.session.commit()
+
     @app.route("/")
     def home():
         return render_template("index.html")
@@ -72,6 +140,7 @@ def create_app():
     @login_required
     def account():
         from .models import UserProfile, BookingRecord, Flight, Traveler
+        from .trip_stats import booking_criteria, tab_filters, trip_stats
 
         profile = UserProfile.query.filter_by(user_id=current_user.id).first()
         if not profile:
@@ -157,32 +226,21 @@ def create_app():
                 return redirect(url_for("account"))
 
         now = datetime.utcnow()
-        filters = [BookingRecord.user_id == current_user.id]
-        if current_user.email:
-            filters.append(and_(BookingRecord.user_id.is_(None), BookingRecord.primary_email == current_user.email))
-        criteria = or_(*filters) if len(filters) > 1 else filters[0]
+        stats = trip_stats(current_user, now)
 
+        # only show the most recent upcoming flights in the “Recent bookings” list
         records = (
             db.session.query(BookingRecord, Flight)
             .join(Flight, BookingRecord.flight_id == Flight.id)
-            .filter(criteria)
+            .filter(booking_criteria(current_user), tab_filters(now)["upcoming"], Flight.depart_time.isnot(None))
             .order_by(BookingRecord.created_at.desc())
+            .limit(RECENT_BOOKINGS)
             .all()
         )
 
-        trips = []
-        upcoming = completed = cancelled = 0
-        total_paid = 0.0
-        touched = False
+        upcoming_trips = []
         for rec, flight in records:
             depart = flight.depart_time
-            status_text = rec.status or flight.status or "On time"
-            if flight.depart_time and flight.depart_time <= now and "cancel" not in status_text.lower():
-                status_text = "Departed"
-                if rec.status != status_text:
-                    rec.status = status_text
-                    db.session.add(rec)
-                    touched = True
             ticket_type = "Economy"
             if rec.passengers:
                 p0 = rec.passengers[0]
@@ -193,39 +251,19 @@ def create_app():
                     or p0.get("ticketType")
                     or "Economy"
                 )
-
-            is_cancelled = "cancel" in status_text.lower()
-            is_upcoming = depart and depart > now and not is_cancelled
-            is_completed = depart and depart <= now and not is_cancelled
-
-            if is_upcoming:
-                upcoming += 1
-            elif is_completed:
-                completed += 1
-            elif is_cancelled:
-                cancelled += 1
-
-            arrival_guess = depart + timedelta(hours=3) if depart else None
-            trips.append(
+            upcoming_trips.append(
                 {
                     "origin": flight.origin,
                     "destination": flight.destination,
                     "ticket_type": ticket_type,
                     "depart": depart,
-                    "arrival": arrival_guess,
-                    "status": status_text,
+                    "arrival": depart + timedelta(hours=3) if depart else None,
+                    "status": rec.status or flight.status or "On time",
                     "booking_ref": rec.booking_ref,
                     "flight_number": f"SW{flight.id:04d}",
                     "total_paid": (rec.total_paid_cents or 0) / 100,
                 }
             )
-            total_paid += (rec.total_paid_cents or 0) / 100
-
-        if touched:
-            db.session.commit()
-
-        saved_amount = total_paid
-        status_overview = (trips[0]["status"] if trips else "") or "No trips yet"
 
         title_options = ["Mr", "Ms", "Mrs", "Mx", "Dr", "Prof"]
         nationality_options = [
@@ -265,20 +303,6 @@ def create_app():
         display_name = current_user.full_name or current_user.email
         initials = current_user.initials or (current_user.email.split("@")[0][:2].upper() if current_user.email else "YO")
 
-        stats = {
-            # total trips
-            "trip_count": upcoming + completed if trips else upcoming,
-            "upcoming": upcoming,
-            "completed": completed,
-            "cancelled": cancelled,
-            "saved": saved_amount,
-            "alerts": 0,
-            "status": status_overview,
-        }
-
-        # only show upcoming flights in the “Recent bookings” list
-        upcoming_trips = [t for t in trips if t.get("depart") and t["depart"] > now and "cancel" not in (t["status"] or "").lower()]
-
         return render_template(
             "account.html",
             profile=profile,
@@ -325,6 +349,13 @@ def create_app():
     from .contact import general_bp
     app.register_blueprint(general_bp)
 
+    from . import metrics
+    app.register_blueprint(metrics.metrics_bp)
+    metrics.init_app(app)
+
+    from . import jobs
+    jobs.init_app(app)
+
 
 
 
@@ -336,5 +367,19 @@ def create_app():
         db.create_all()
         ensure_traveler_columns()
         ensure_booking_record_user_column()
+        ensure_booking_ref_column()
+        ensure_indexes()
+
+        from .customer_search import ensure_customer_index
+        ensure_customer_index()
+
+        # seats and cabin counters for bookings made before those tables existed
+        from .seat_allocation import backfill_seat_assignments
+        from .availability import backfill_cabin_inventory
+        backfill_seat_assignments()
+        backfill_cabin_inventory()
+
+        from .notifications import import_legacy_subscribers
+        import_legacy_subscribers()
 
     return app
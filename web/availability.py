@@ -0,0 +1,162 @@
+from collections import Counter
+
+from sqlalchemy import case, update
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import AircraftType, BookingRecord, CabinInventory, Flight, SeatAssignment, SeatMap
+from .seat_allocation import blocked_for, blocked_seats
+from .seat_inventory import cabin_capacity, cabin_for_row
+from . import db
+
+# per-flight, per-cabin availability counters.
+# a cabin_inventory row is created the first time a flight sells a seat; until then the flight is
+# fully available and its capacity is the aircraft layout less the flight's blocked seats. every change is a single
+# conditional UPDATE inside the caller's booking transaction, so counters can't drift or oversell.
+
+CABINS = ("First", "Business", "Economy")
+
+
+class SoldOut(Exception):
+    def __init__(self, cabins):
+        self.cabins = sorted(set(cabins))
+        super().__init__(f"Not enough seats left in {', '.join(self.cabins)}.")
+
+
+def _normalize_cabin(value) -> str:
+    text = (value or "").lower()
+    if "first" in text:
+        return "First"
+    if "business" in text:
+        return "Business"
+    return "Economy"
+
+
+# how many seats a booking takes from each cabin: the chosen seat's row decides, else the class preference
+def passenger_cabins(flight, passengers) -> Counter:
+    atype = flight.aircraft_type
+    counts = Counter()
+    for p in passengers or []:
+        if not isinstance(p, dict):
+            continue
+        code = p.get("seatCode") or ""
+        if atype and code[:-1].isdigit():
+            counts[cabin_for_row(int(code[:-1]), atype.class_map)] += 1
+        else:
+            counts[_normalize_cabin(p.get("classPreference") or p.get("cabin"))] += 1
+    return counts
+
+
+def _ensure_rows(flight):
+    if not flight.aircraft_type:
+        return
+    capacity = cabin_capacity(flight.aircraft_type, blocked_seats(flight))
+    stmt = insert(CabinInventory).values([
+        {"flight_id": flight.id, "cabin": cabin, "capacity": seats, "sold": 0}
+        for cabin, seats in capacity.items()
+    ])
+    db.session.execute(stmt.on_conflict_do_nothing(index_elements=["flight_id", "cabin"]))
+
+
+# takes seats off the counters (no commit); raises SoldOut after rolling back if a cabin is full
+def reserve(flight, cabins: Counter):
+    cabins = {c: n for c, n in cabins.items() if n > 0}
+    if not cabins:
+        return
+    _ensure_rows(flight)
+
+    short = []
+    for cabin, n in cabins.items():
+        result = db.session.execute(
+            update(CabinInventory)
+            .where(
+                CabinInventory.flight_id == flight.id,
+                CabinInventory.cabin == cabin,
+                CabinInventory.sold + n <= CabinInventory.capacity,
+            )
+            .values(sold=CabinInventory.sold + n)
+        )
+        if not result.rowcount:
+            short.append(cabin)
+    if short:
+        db.session.rollback()
+        raise SoldOut(short)
+
+
+# gives seats back to the counters (no commit)
+def release(flight_id: int, cabins: Counter):
+    for cabin, n in cabins.items():
+        if n <= 0:
+            continue
+        db.session.execute(
+            update(CabinInventory)
+            .where(CabinInventory.flight_id == flight_id, CabinInventory.cabin == cabin)
+            .values(sold=case((CabinInventory.sold > n, CabinInventory.sold - n), else_=0))
+        )
+
+
+# seats left per cabin for many flights, in batched queries: {flight_id: {cabin: seats_left}}
+# accepts Flight models or search index rows (anything with id and aircraft_type_id)
+def availability_for(flights):
+    flights = [f for f in flights or [] if f.aircraft_type_id]
+    if not flights:
+        return {}
+
+    atypes = {a.id: a for a in AircraftType.query.all()}
+    flights = [f for f in flights if f.aircraft_type_id in atypes]
+    out = {}
+    ids = [f.id for f in flights]
+    for i in range(0, len(ids), 500):
+        rows = db.session.query(CabinInventory).filter(CabinInventory.flight_id.in_(ids[i:i + 500])).all()
+        for row in rows:
+            out.setdefault(row.flight_id, {})[row.cabin] = row.available
+
+    # flights without counters yet: capacity after their own blocked seats, as _ensure_rows starts them
+    fresh = [f for f in flights if f.id not in out]
+    seat_maps = {}
+    for i in range(0, len(fresh), 500):
+        chunk = [f.id for f in fresh[i:i + 500]]
+        seat_maps.update((m.flight_id, m) for m in SeatMap.query.filter(SeatMap.flight_id.in_(chunk)).all())
+    capacities = {}
+    for f in fresh:
+        atype = atypes[f.aircraft_type_id]
+        blocked = blocked_for(atype, seat_maps.get(f.id))
+        key = (atype.id, tuple(sorted(blocked)))
+        if key not in capacities:
+            capacities[key] = cabin_capacity(atype, blocked)
+        out[f.id] = dict(capacities[key])
+    return out
+
+
+# fills cabin_inventory the first time for flights that already sold seats (databases from before the
+# counters existed): seated passengers count in their seat's cabin (seat_assignment, so run after
+# backfill_seat_assignments), live booking records' seatless passengers in their class preference.
+def backfill_cabin_inventory():
+    if db.session.query(CabinInventory.flight_id).first():
+        return
+    flights = {f.id: f for f in Flight.query.filter(Flight.aircraft_type_id.isnot(None)).all()}
+    sold = {}
+    for flight_id, code in db.session.query(SeatAssignment.flight_id, SeatAssignment.seat_code):
+        flight = flights.get(flight_id)
+        if flight is not None and code[:-1].isdigit():
+            cabin = cabin_for_row(int(code[:-1]), flight.aircraft_type.class_map)
+            sold.setdefault(flight_id, Counter())[cabin] += 1
+    records = db.session.query(BookingRecord.flight_id, BookingRecord.status, BookingRecord.passengers)
+    for flight_id, status, passengers in records:
+        if flight_id not in flights or "cancel" in (status or "").lower():
+            continue
+        for p in passengers if isinstance(passengers, list) else []:
+            if isinstance(p, dict) and not p.get("seatCode"):
+                cabin = _normalize_cabin(p.get("classPreference") or p.get("cabin"))
+                sold.setdefault(flight_id, Counter())[cabin] += 1
+
+    rows = []
+    for flight_id, counts in sold.items():
+        flight = flights[flight_id]
+        capacity = cabin_capacity(flight.aircraft_type, blocked_seats(flight))
+        rows.extend(
+            {"flight_id": flight_id, "cabin": cabin, "capacity": seats, "sold": counts.get(cabin, 0)}
+            for cabin, seats in capacity.items()
+        )
+    if rows:
+        db.session.execute(insert(CabinInventory).on_conflict_do_nothing(), rows)
+    db.session.commit()
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import socket
+import threading
+import time
+
+# booking references: "BK-" + 13 Crockford base32 characters encoding a 63-bit snowflake id
+#   41 bits  milliseconds since EPOCH_MS (good for ~69 years)
+#   10 bits  worker id (BOOKING_REF_WORKER_ID, else derived from host name + pid)
+#   12 bits  per-millisecond sequence (4096 refs per ms per worker)
+# refs sort by creation time and are unique across processes without touching the database as long
+# as every process has its own worker id. set BOOKING_REF_WORKER_ID per process when running several;
+# the host + pid fallback can still collide (1 in 1024 per pair), so checkout retries with a fresh ref
+# on DuplicateBookingRef.
+# if the clock steps backwards the generator keeps counting from the last timestamp it used, and a
+# full sequence borrows the next millisecond instead of sleeping, so ids never repeat or go back.
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"  # Crockford: no I, L, O, U
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+CODE_LENGTH = 13
+PREFIX = "BK-"
+
+
+# a booking reference that is already stored (two processes ended up with the same worker id)
+class DuplicateBookingRef(Exception):
+    pass
+
+
+def _default_worker_id() -> int:
+    configured = os.getenv("BOOKING_REF_WORKER_ID")
+    if configured:
+        return int(configured) & MAX_WORKER
+    seed = f"{socket.gethostname()}:{os.getpid()}".encode()
+    return int.from_bytes(hashlib.blake2b(seed, digest_size=4).digest(), "big") & MAX_WORKER
+
+
+def encode(value: int, length: int = CODE_LENGTH) -> str:
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def decode(code: str) -> int:
+    code = code.upper().replace("-", "").translate(str.maketrans("IL0O", "1100"))
+    value = 0
+    for ch in code:
+        value = value * 32 + ALPHABET.index(ch)
+    return value
+
+
+class SnowflakeGenerator:
+    def __init__(self, worker_id: int | None = None, clock=None):
+        self.worker_id = _default_worker_id() if worker_id is None else worker_id & MAX_WORKER
+        self._clock = clock or (lambda: time.time_ns() // 1_000_000)
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self) -> int:
+        with self._lock:
+            now = self._clock() - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            else:
+                # same millisecond, or the clock went backwards: keep counting on the last timestamp
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_ref(self) -> str:
+        return PREFIX + encode(self.next_id())
+
+
+_generator = SnowflakeGenerator()
+
+
+# a forked worker must not share its parent's worker id or sequence
+def _reset_after_fork():
+    global _generator
+    _generator = SnowflakeGenerator()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def next_booking_ref() -> str:
+    return _generator.next_ref()
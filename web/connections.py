@@ -0,0 +1,134 @@
+import time
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from .search_index import FlightRow, flight_index
+
+# connecting-itinerary search over the route network.
+# works entirely off the in-memory search index: the route graph picks candidate hubs and the
+# time-sorted departure buckets give each leg's onward connections with a bisect.
+
+# the app shows every flight as arriving three hours after departure (see My Bookings / account)
+BLOCK_TIME = timedelta(hours=3)
+MIN_CONNECTION = timedelta(minutes=45)
+MAX_CONNECTION = timedelta(hours=6)
+DEFAULT_BUDGET_MS = 50
+
+
+class Itinerary(NamedTuple):
+    legs: tuple[FlightRow, ...]
+    price_cents: int
+    depart_time: datetime
+    arrive_time: datetime
+
+    @property
+    def stops(self) -> int:
+        return len(self.legs) - 1
+
+    @property
+    def duration(self) -> timedelta:
+        return self.arrive_time - self.depart_time
+
+    def to_dict(self):
+        return {
+            "stops": self.stops,
+            "price_cents": self.price_cents,
+            "depart_time": self.depart_time.isoformat(),
+            "arrive_time": self.arrive_time.isoformat(),
+            "duration_minutes": int(self.duration.total_seconds() // 60),
+            "legs": [
+                {
+                    "flight_id": leg.id,
+                    "origin": leg.origin,
+                    "destination": leg.destination,
+                    "depart_time": leg.depart_time.isoformat(),
+                    "arrive_time": (leg.depart_time + BLOCK_TIME).isoformat(),
+                    "price_cents": leg.price_cents,
+                }
+                for leg in self.legs
+            ],
+        }
+
+
+def _itinerary(legs) -> Itinerary:
+    return Itinerary(
+        tuple(legs),
+        sum(leg.price_cents for leg in legs),
+        legs[0].depart_time,
+        legs[-1].depart_time + BLOCK_TIME,
+    )
+
+
+def _is_cancelled(row: FlightRow) -> bool:
+    return "cancel" in (row.status or "").lower()
+
+
+# onward flights that make a valid connection from `leg`
+def _onward(leg: FlightRow, destination: str, min_conn: timedelta, max_conn: timedelta):
+    arrive = leg.depart_time + BLOCK_TIME
+    return [
+        row for row in flight_index.departures_between(leg.destination, destination, arrive + min_conn, arrive + max_conn)
+        if not _is_cancelled(row)
+    ]
+
+
+# one-stop and two-stop itineraries from origin to destination departing on `day`.
+# returns (itineraries ranked by price or duration, truncated) where truncated means the latency
+# budget ran out before every hub was explored.
+def find_connections(
+    origin: str,
+    destination: str,
+    day: date,
+    max_stops: int = 2,
+    sort: str = "price",
+    limit: int = 20,
+    min_connection: timedelta = MIN_CONNECTION,
+    max_connection: timedelta = MAX_CONNECTION,
+    budget_ms: float = DEFAULT_BUDGET_MS,
+):
+    graph = flight_index.graph()
+    # the budget covers the search itself, not a (re)build of the index
+    deadline = time.perf_counter() + budget_ms / 1000
+    if origin not in graph or origin == destination:
+        return [], False
+
+    # airports with a direct flight into the destination; only these can be the last hub
+    feeders = {a for a, dests in graph.items() if destination in dests}
+
+    found = []
+    truncated = False
+    first_hubs = sorted(graph[origin] - {origin, destination})
+    # checked per hub, per first leg and per second hub, so one busy hub can't run far past the budget
+    for hub in first_hubs:
+        if truncated or time.perf_counter() > deadline:
+            truncated = True
+            break
+
+        second_hubs = []
+        if max_stops >= 2:
+            second_hubs = sorted((graph.get(hub, set()) & feeders) - {origin, destination, hub})
+        if hub not in feeders and not second_hubs:
+            continue
+
+        for leg1 in flight_index.departures(origin, hub, day):
+            if time.perf_counter() > deadline:
+                truncated = True
+                break
+            if _is_cancelled(leg1):
+                continue
+            if hub in feeders:
+                for leg2 in _onward(leg1, destination, min_connection, max_connection):
+                    found.append(_itinerary((leg1, leg2)))
+            for hub2 in second_hubs:
+                if time.perf_counter() > deadline:
+                    truncated = True
+                    break
+                for leg2 in _onward(leg1, hub2, min_connection, max_connection):
+                    for leg3 in _onward(leg2, destination, min_connection, max_connection):
+                        found.append(_itinerary((leg1, leg2, leg3)))
+
+    if sort == "duration":
+        found.sort(key=lambda it: (it.duration, it.price_cents, it.depart_time))
+    else:
+        found.sort(key=lambda it: (it.price_cents, it.duration, it.depart_time))
+    return found[:limit], truncated
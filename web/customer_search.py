@@ -0,0 +1,148 @@
+from sqlalchemy import text
+
+from . import db
+from .booking_refs import ALPHABET, CODE_LENGTH, PREFIX
+
+# full-text customer lookup for staff.
+# one customer_fts row per Booking (rowid = booking.id) holding the passenger's name, email, phone
+# digits and booking references. the trigram tokenizer lets a plain MATCH answer substring and
+# prefix searches from the index, and OR-ing a term's trigrams ranked by bm25 gives typo-tolerant
+# "fuzzy" matches when nothing matches exactly.
+
+FTS_TABLE = "customer_fts"
+MIN_TERM = 3  # shortest term a trigram MATCH can answer
+
+
+def fts_available() -> bool:
+    return db.engine.url.drivername.startswith("sqlite")
+
+
+def _digits(value) -> str:
+    return "".join(ch for ch in (value or "") if ch.isdigit())
+
+
+# sql expression that strips the usual phone punctuation (sqlite has no regex replace)
+def _digits_sql(col: str) -> str:
+    expr = col
+    for ch in ("-", " ", "(", ")", "+", "."):
+        expr = f"REPLACE({expr}, '{ch}', '')"
+    return expr
+
+
+# creates the index table and backfills it from existing bookings the first time
+def ensure_customer_index():
+    if not fts_available():
+        return
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "first_name, last_name, email, phone, booking_ref, tokenize='trigram')"
+    ))
+    has_rows = db.session.execute(text(f"SELECT 1 FROM {FTS_TABLE} LIMIT 1")).first()
+    if not has_rows:
+        phone_digits = _digits_sql("COALESCE(c.phone, '')")
+        db.session.execute(text(
+            f"INSERT INTO {FTS_TABLE} (rowid, first_name, last_name, email, phone, booking_ref) "
+            f"SELECT b.id, c.first_name, c.last_name, c.email, {phone_digits}, "
+            "'BK-' || substr('000000' || b.id, -6, 6) "
+            "FROM booking b JOIN customer c ON c.id = b.customer_id"
+        ))
+    db.session.commit()
+
+
+# adds freshly flushed bookings to the index (inside the booking transaction, no commit)
+def index_bookings(bookings, customer, booking_ref: str | None = None):
+    if not fts_available():
+        return
+    rows = []
+    for b in bookings:
+        refs = f"BK-{b.id:06d}"
+        if booking_ref:
+            refs = f"{refs} {booking_ref}"
+        rows.append({
+            "id": b.id,
+            "first": customer.first_name,
+            "last": customer.last_name,
+            "email": customer.email,
+            "phone": _digits(customer.phone),
+            "refs": refs,
+        })
+    if rows:
+        db.session.execute(
+            text(
+                f"INSERT OR REPLACE INTO {FTS_TABLE} (rowid, first_name, last_name, email, phone, booking_ref) "
+                "VALUES (:id, :first, :last, :email, :phone, :refs)"
+            ),
+            rows,
+        )
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _trigrams(term: str):
+    term = term.lower()
+    return sorted({term[i:i + 3] for i in range(len(term) - 2)})
+
+
+# exact booking lookups: "12" / "BK-000012" is a booking id, "BK-" + 13 base32 characters is a
+# booking record reference (indexed on booking.booking_ref). None when the term is neither, so it is
+# searched like any other field.
+def _ref_ids(booking_ref: str):
+    code = booking_ref.upper()
+    if code.startswith(PREFIX):
+        code = code[len(PREFIX):]
+    if len(code) == CODE_LENGTH and all(ch in ALPHABET for ch in code):
+        ids = [r[0] for r in db.session.execute(
+            text("SELECT id FROM booking WHERE booking_ref = :ref ORDER BY id"),
+            {"ref": PREFIX + code},
+        )]
+        if ids or not code.isdigit():
+            return ids
+    if code.isdigit():
+        found = db.session.execute(text("SELECT id FROM booking WHERE id = :id"), {"id": int(code)}).first()
+        return [found[0]] if found else []
+    return None
+
+
+# booking ids matching the lookup form, best matches first.
+# every filled-in field must match (substring/prefix); if that finds nothing, fall back to fuzzy
+# matching on the trigrams of each field. trigram MATCH needs MIN_TERM characters, so shorter name /
+# email / phone terms are ignored rather than answered by scanning the index content.
+def search_customers(first="", last="", email="", phone="", booking_ref="", limit=100):
+    fields = {
+        "first_name": first.strip(),
+        "last_name": last.strip(),
+        "email": email.strip(),
+        "phone": _digits(phone),
+        "booking_ref": booking_ref.strip(),
+    }
+    ref_ids = _ref_ids(fields["booking_ref"]) if fields["booking_ref"] else None
+    if ref_ids is not None:
+        del fields["booking_ref"]
+    fields = {col: term for col, term in fields.items() if len(term) >= MIN_TERM}
+    if ref_ids is not None and (not ref_ids or not fields):
+        return ref_ids[:limit]
+    if not fields:
+        return []
+
+    params = {"limit": limit}
+    if ref_ids is not None:
+        # the other fields only narrow the exact booking matches down
+        params.update({f"ref{i}": bid for i, bid in enumerate(ref_ids)})
+        in_refs = f" AND rowid IN ({', '.join(f':ref{i}' for i in range(len(ref_ids)))})"
+    else:
+        in_refs = ""
+
+    params["match"] = " AND ".join(f"{col} : {_quote(term)}" for col, term in fields.items())
+    sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match{in_refs} ORDER BY rank LIMIT :limit"
+    ids = [r[0] for r in db.session.execute(text(sql), params)]
+    if ids:
+        return ids
+
+    fuzzy = []
+    for col, term in fields.items():
+        fuzzy.append(f"{col} : ({' OR '.join(_quote(g) for g in _trigrams(term))})")
+    params["match"] = " AND ".join(fuzzy)
+    rows = db.session.execute(text(sql), params)
+    return [r[0] for r in rows]
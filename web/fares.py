@@ -0,0 +1,78 @@
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+# fare rules shared by checkout (payments._compute_total_cents) and the batch quote api.
+# quote_batch prices every flight x passenger mix x billing country combination with numpy array
+# arithmetic. integer cents stay int64 and tax is rounded half-to-even on the same float64 product
+# python's round() sees, so each quote equals what checkout would charge to the cent before any
+# seat fees (seat_pricing), which are only known once seats are picked.
+
+# tax rates for payment calculations
+TAX_TABLE: dict[str, float] = {
+    "Canada": 0.13, "United States": 0.08, "Mexico": 0.16, "Bahamas": 0.12, "Bermuda": 0.075,
+    "Jamaica": 0.15, "Dominican Republic": 0.18, "Cuba": 0.14, "Puerto Rico": 0.115,
+    "Belize": 0.12, "Costa Rica": 0.13, "Panama": 0.07, "Guatemala": 0.12, "Honduras": 0.15,
+    "El Salvador": 0.13, "Nicaragua": 0.15, "Trinidad and Tobago": 0.12, "Barbados": 0.175,
+    "Aruba": 0.18, "Cayman Islands": 0.0, "Brazil": 0.17, "Argentina": 0.21, "Chile": 0.19,
+    "Peru": 0.18, "Colombia": 0.19, "Ecuador": 0.12, "Uruguay": 0.22, "Paraguay": 0.1,
+    "Bolivia": 0.13, "Venezuela": 0.16, "United Kingdom": 0.2, "Ireland": 0.23, "France": 0.2,
+    "Germany": 0.19, "Spain": 0.21, "Italy": 0.22, "Portugal": 0.23, "Netherlands": 0.21,
+    "Switzerland": 0.081, "Greece": 0.24, "Turkey": 0.18, "United Arab Emirates": 0.05,
+    "Qatar": 0.05, "Saudi Arabia": 0.15, "Egypt": 0.14, "South Africa": 0.15,
+    "Kenya": 0.16, "Morocco": 0.2, "India": 0.18, "China": 0.13, "Japan": 0.1, "South Korea": 0.1,
+    "Singapore": 0.09, "Thailand": 0.07, "Vietnam": 0.1, "Malaysia": 0.08, "Indonesia": 0.11,
+    "Philippines": 0.12, "Australia": 0.1, "New Zealand": 0.15, "Fiji": 0.15,
+}
+DEFAULT_TAX_RATE = 0.13
+
+UPGRADE_CENTS = {"first": 90000, "business": 45000}  # $900 First, $450 Business
+BAG_CENTS = 5000  # $50 per extra bag
+
+# quote api input bounds; keep every total well inside int64
+MAX_BASE_CENTS = 10**9
+MAX_EXTRA_BAGS = 99
+
+
+def tax_rate_for(country: str | None) -> float:
+    if not country:
+        return DEFAULT_TAX_RATE
+    return TAX_TABLE.get(country, DEFAULT_TAX_RATE)
+
+
+def _upgrade_for(p: Dict[str, Any]) -> int:
+    cls = str(p.get("classPreference") or p.get("cabin") or "").lower()
+    if "first" in cls:
+        return UPGRADE_CENTS["first"]
+    if "business" in cls:
+        return UPGRADE_CENTS["business"]
+    return 0
+
+
+def extra_bags_for(p: Dict[str, Any]) -> int:
+    try:
+        return max(0, int(p.get("extraBags") or 0))
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+# what a passenger list adds up to: (passengers charged, upgrade cents, extra bags)
+def passenger_mix(passengers: List[Dict[str, Any]]):
+    upgrade_cents = 0
+    extra_bags = 0
+    for p in passengers:
+        upgrade_cents += _upgrade_for(p)
+        extra_bags += extra_bags_for(p)
+    return max(1, len(passengers)), upgrade_cents, extra_bags
+
+
+# totals in cents for every combination, shaped (len(base_prices), len(mixes), len(countries))
+def quote_batch(base_prices: Sequence[int], mixes: Iterable[List[Dict[str, Any]]], countries: Sequence[str | None]):
+    base = np.asarray([b or 0 for b in base_prices], dtype=np.int64)
+    summary = np.asarray([passenger_mix(m) for m in mixes], dtype=np.int64).reshape(-1, 3)
+    rates = np.asarray([tax_rate_for(c) for c in countries], dtype=np.float64)
+
+    pax, upgrades, bags = summary[:, 0], summary[:, 1], summary[:, 2]
+    subtotal = base[:, None] * pax[None, :] + (upgrades + bags * BAG_CENTS)[None, :]
+    tax = np.rint(subtotal[:, :, None] * rates[None, None, :]).astype(np.int64)
+    return subtotal[:, :, None] + tax
@@ -0,0 +1,86 @@
+import hashlib
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from .models import IdempotencyKey
+from . import db
+
+# idempotency keys for payment endpoints.
+# each payment form carries a fresh key. the key row is inserted at the start of the booking
+# transaction and gets the result written into it just before that transaction commits, so a key
+# exists exactly when its booking does. a duplicate submission (double click, browser retry, another
+# worker) blocks on the first one's insert until it commits, then fails with IntegrityError and
+# replays the stored result. failed payments roll the key back with everything else, so those can
+# simply be retried.
+
+DEFAULT_TTL_HOURS = 24
+MAX_KEY_LENGTH = 64
+CLAIM_ATTEMPTS = 3
+
+
+class KeyReused(Exception):
+    pass
+
+
+def new_key() -> str:
+    return uuid.uuid4().hex
+
+
+def fingerprint(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _ttl() -> timedelta:
+    return timedelta(hours=current_app.config.get("IDEMPOTENCY_TTL_HOURS", DEFAULT_TTL_HOURS))
+
+
+def _stored(key: str):
+    return db.session.execute(
+        db.select(IdempotencyKey.endpoint, IdempotencyKey.fingerprint, IdempotencyKey.response, IdempotencyKey.expires_at)
+        .where(IdempotencyKey.key == key)
+    ).first()
+
+
+# claims `key` in the current transaction. returns (row, None) for a first submission, in which case the
+# caller stores its result on row.response before committing, or (None, response) for a duplicate.
+# raises KeyReused when the key was already used for a different request.
+def begin(key: str | None, endpoint: str, request_fingerprint: str):
+    if not key:
+        return None, None
+    key = key[:MAX_KEY_LENGTH]
+    now = datetime.utcnow()
+
+    for _ in range(CLAIM_ATTEMPTS):
+        # an expired key can be used again
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.expires_at <= now))
+        row = IdempotencyKey(key=key, endpoint=endpoint, fingerprint=request_fingerprint, expires_at=now + _ttl())
+        db.session.add(row)
+        try:
+            db.session.flush()
+            return row, None
+        except IntegrityError:
+            db.session.rollback()
+
+        stored = _stored(key)
+        if stored is None:
+            # the first submission rolled back in the meantime; try to claim it again
+            continue
+        if stored.endpoint != endpoint or stored.fingerprint != request_fingerprint:
+            raise KeyReused("This payment form was already used for a different booking.")
+        return None, stored.response
+    raise KeyReused("This payment is already being processed.")
+
+
+def purge_expired(now: datetime | None = None) -> int:
+    now = now or datetime.utcnow()
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now))
+    db.session.commit()
+    return result.rowcount or 0
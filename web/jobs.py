@@ -0,0 +1,95 @@
+import logging
+import os
+import threading
+
+import click
+
+from . import db
+
+log = logging.getLogger(__name__)
+
+# background jobs: small periodic tasks run on daemon threads inside the web process.
+# every worker process may run them, so each job has to be safe to run concurrently (set-based,
+# idempotent updates). run.py starts them; `flask <command>` runs a single pass by hand.
+
+_started = False
+
+
+# runs fn() inside an app context every `interval` seconds until the process exits.
+# setting `wake` (a threading.Event) runs it straight away instead of waiting out the interval.
+def run_periodically(app, name: str, interval: float, fn, wake: threading.Event | None = None):
+    def loop():
+        event = wake or threading.Event()
+        while True:
+            event.wait(interval)
+            event.clear()
+            with app.app_context():
+                try:
+                    fn()
+                except Exception:
+                    log.exception("background job %s failed", name)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=loop, name=f"job-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_background_jobs(app):
+    global _started
+    if _started or not app.config.get("BACKGROUND_JOBS", True):
+        return
+    # with the debug reloader only the child process (the one serving requests) runs jobs
+    if app.debug and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        return
+    _started = True
+
+    from .status_sweeper import sweep_departed
+    run_periodically(app, "status-sweeper", app.config["STATUS_SWEEP_SECONDS"], sweep_departed)
+
+    from .outbox import process_outbox, wake_event
+    run_periodically(app, "outbox", app.config["OUTBOX_POLL_SECONDS"], process_outbox, wake=wake_event())
+
+    from . import status_fanout
+    run_periodically(
+        app,
+        "status-fanout",
+        app.config["STATUS_FANOUT_SECONDS"],
+        status_fanout.fan_out_status_changes,
+        wake=status_fanout.wake_event(),
+    )
+
+    from .idempotency import purge_expired
+    run_periodically(app, "idempotency-purge", 3600, purge_expired)
+
+    # the first tick builds the reminder heap from the database
+    from .reminders import send_due_reminders
+    run_periodically(app, "reminders", app.config["REMINDER_TICK_SECONDS"], send_due_reminders)
+
+
+def init_app(app):
+    @app.cli.command("sweep-status")
+    def sweep_status_command():
+        """Mark bookings on departed flights as Departed."""
+        from .status_sweeper import sweep_departed
+        click.echo(f"Updated {sweep_departed()} booking(s).")
+
+    @app.cli.command("fan-out-status")
+    def fan_out_status_command():
+        """Queue notifications for pending flight status changes."""
+        from .status_fanout import fan_out_status_changes
+        click.echo(f"Queued {fan_out_status_changes()} message(s).")
+
+    @app.cli.command("send-reminders")
+    def send_reminders_command():
+        """Queue the departure reminders that are due now."""
+        from .reminders import send_due_reminders
+        click.echo(f"Queued {send_due_reminders()} message(s).")
+
+    @app.cli.command("send-outbox")
+    def send_outbox_command():
+        """Send due email / sms messages from the outbox."""
+        from .outbox import process_outbox
+        click.echo(f"Processed {process_outbox()} message(s).")
@@ -0,0 +1,289 @@
+import heapq
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from flask import Blueprint, Response, current_app, g, render_template, request
+from flask_login import current_user, login_required
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# per-request sql and timing instrumentation.
+# sqlalchemy cursor events time every statement and charge it to the flask request running it;
+# request hooks then fold the request's wall time, statement count, sql time, slowest statements
+# and most repeated statement (the usual sign of an n+1) into per-endpoint stats. percentiles come
+# from fixed-bucket histograms, so memory stays the same however many requests are served.
+# /staff/metrics shows the numbers to staff, /metrics serves them as prometheus text.
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+TOP_STATEMENTS = 5
+STATEMENT_CHARS = 400
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    # estimate by linear interpolation inside the bucket holding the q-th observation
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = self.bounds[i - 1] if i else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lo + (hi - lo) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+# keeps the k biggest (value, statement) pairs, one per distinct statement
+def _keep_top(top: list, value: float, statement: str, k: int = TOP_STATEMENTS):
+    for i, (v, s) in enumerate(top):
+        if s == statement:
+            if value > v:
+                top[i] = (value, statement)
+                heapq.heapify(top)
+            return
+    if len(top) < k:
+        heapq.heappush(top, (value, statement))
+    elif value > top[0][0]:
+        heapq.heapreplace(top, (value, statement))
+
+
+def _clean(statement: str) -> str:
+    return " ".join(statement.split())[:STATEMENT_CHARS]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql = Histogram(LATENCY_BUCKETS_MS)
+        self.slowest = []   # (ms, statement)
+        self.repeated = []  # (executions in one request, statement)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, EndpointStats] = {}
+        self.started = time.time()
+
+    def record(self, endpoint: str, status: int, wall_ms: float, req: "RequestStats"):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats()
+            stats.requests += 1
+            if status >= 500:
+                stats.errors += 1
+            stats.latency.observe(wall_ms)
+            stats.queries.observe(req.queries)
+            stats.sql.observe(req.sql_ms)
+            for ms, statement in req.slowest:
+                _keep_top(stats.slowest, ms, _clean(statement))
+            if req.counts:
+                statement, n = req.counts.most_common(1)[0]
+                if n > 1:
+                    _keep_top(stats.repeated, n, _clean(statement))
+
+    def snapshot(self):
+        with self._lock:
+            rows = []
+            for endpoint, s in self._stats.items():
+                rows.append({
+                    "endpoint": endpoint,
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "p50_ms": s.latency.quantile(0.5),
+                    "p90_ms": s.latency.quantile(0.9),
+                    "p99_ms": s.latency.quantile(0.99),
+                    "max_ms": s.latency.max,
+                    "total_ms": s.latency.total,
+                    "queries_mean": s.queries.mean,
+                    "queries_p90": s.queries.quantile(0.9),
+                    "queries_max": s.queries.max,
+                    "sql_mean_ms": s.sql.mean,
+                    "sql_share": s.sql.total / s.latency.total if s.latency.total else 0.0,
+                    "slowest": sorted(s.slowest, reverse=True),
+                    "repeated": sorted(s.repeated, reverse=True),
+                })
+        rows.sort(key=lambda r: r["total_ms"], reverse=True)
+        return rows
+
+    def prometheus(self) -> str:
+        lines = []
+
+        def histogram(name, help_text, pick, scale=1.0):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for endpoint, s in items:
+                h = pick(s)
+                label = f'endpoint="{endpoint}"'
+                cumulative = 0
+                for bound, n in zip(h.bounds, h.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{label},le="{bound * scale:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{label}}} {h.total * scale:.6f}")
+                lines.append(f"{name}_count{{{label}}} {h.count}")
+
+        with self._lock:
+            items = sorted(self._stats.items())
+            lines.append("# HELP skywing_requests_total Requests served, by endpoint.")
+            lines.append("# TYPE skywing_requests_total counter")
+            for endpoint, s in items:
+                lines.append(f'skywing_requests_total{{endpoint="{endpoint}"}} {s.requests}')
+            lines.append("# HELP skywing_request_errors_total Requests that ended in a 5xx, by endpoint.")
+            lines.append("# TYPE skywing_request_errors_total counter")
+            for endpoint, s in items:
+                lines.append(f'skywing_request_errors_total{{endpoint="{endpoint}"}} {s.errors}')
+            histogram("skywing_request_duration_seconds", "Wall time per request.", lambda s: s.latency, 0.001)
+            histogram("skywing_request_queries", "SQL statements per request.", lambda s: s.queries)
+            histogram("skywing_request_sql_seconds", "Time spent in SQL per request.", lambda s: s.sql, 0.001)
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started = time.time()
+
+
+registry = Registry()
+
+
+class RequestStats:
+    __slots__ = ("started", "queries", "sql_ms", "slowest", "counts")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.slowest = []   # (ms, raw statement), cleaned up only when merged
+        self.counts = Counter()
+
+
+def _current():
+    try:
+        return g.get("_request_stats")
+    except RuntimeError:  # outside a request / app context (jobs, cli)
+        return None
+
+
+# the start time rides on the statement's execution context, so a statement that raises leaves nothing behind
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    ms = (time.perf_counter() - started) * 1000
+    req = _current()
+    if req is None:
+        return
+    req.queries += 1
+    req.sql_ms += ms
+    req.counts[statement] += 1
+    if len(req.slowest) < TOP_STATEMENTS:
+        heapq.heappush(req.slowest, (ms, statement))
+    elif ms > req.slowest[0][0]:
+        heapq.heapreplace(req.slowest, (ms, statement))
+
+
+def _endpoint() -> str:
+    if request.url_rule is not None:
+        return request.endpoint or request.url_rule.rule
+    return "<unmatched>"
+
+
+_listening = False
+
+
+def init_app(app):
+    global _listening
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+
+    # one set of listeners for every engine; statements outside a request are ignored
+    if not _listening:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _listening = True
+
+    @app.before_request
+    def start_request_stats():
+        if request.endpoint != "static":
+            g._request_stats = RequestStats()
+
+    @app.after_request
+    def note_status(response):
+        g._request_status = response.status_code
+        return response
+
+    # teardown runs after streamed bodies (csv downloads) have finished, so their queries count too
+    @app.teardown_request
+    def record_request_stats(exc):
+        req = g.pop("_request_stats", None)
+        if req is None:
+            return
+        status = 500 if exc is not None else g.get("_request_status", 500)
+        registry.record(_endpoint(), status, (time.perf_counter() - req.started) * 1000, req)
+
+
+def _allowed() -> bool:
+    token = current_app.config.get("METRICS_TOKEN")
+    header = request.headers.get("Authorization", "")
+    if token and hmac.compare_digest(header.encode(), f"Bearer {token}".encode()):
+        return True
+    return current_user.is_authenticated and current_user.is_staff
+
+
+@metrics_bp.route("/staff/metrics", methods=["GET", "POST"])
+@login_required
+def staff_metrics():
+    if not current_user.is_staff:
+        return "Forbidden", 403
+    if request.method == "POST":
+        registry.reset()
+    return render_template(
+        "staff_metrics.html",
+        rows=registry.snapshot(),
+        since=time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(registry.started)),
+    )
+
+
+# prometheus scrape target: staff session, or "Authorization: Bearer <METRICS_TOKEN>"
+@metrics_bp.route("/metrics")
+def prometheus_metrics():
+    if not _allowed():
+        return "Forbidden", 403
+    return Response(registry.prometheus(), mimetype="text/plain; version=0.0.4")
@@ -122,7 +122,7 @@ class Flight(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     origin = db.Column(db.String(3), nullable=False)
     destination = db.Column(db.String(3), nullable=False)
-    depart_time = db.Column(db.DateTime, nullable=False)
+    depart_time = db.Column(db.DateTime, nullable=False, index=True)
     price_cents = db.Column(db.Integer, nullable=False, default=0)
     status = db.Column(db.String(32), default="On time")
     status_note = db.Column(db.String(255), nullable=True)
@@ -134,11 +134,11 @@ class Flight(db.Model):
         lazy="joined",
     )
 
-    # Seats backref
-    seats = db.relationship(
-        "Seat",
+    # compact seat inventory (one row per flight)
+    seat_map = db.relationship(
+        "SeatMap",
         back_populates="flight",
-        lazy="dynamic",
+        uselist=False,
         cascade="all, delete-orphan",
     )
 
@@ -146,27 +146,68 @@ class Flight(db.Model):
         return f"<Flight {self.origin}->{self.destination} {self.depart_time}>"
 
 
-class Seat(db.Model):
-    __tablename__ = "seats"
+# per-flight seat state packed into a bitmap (see web/seat_inventory.py for the bit order)
+class SeatMap(db.Model):
+    __tablename__ = "seat_map"
+
+    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"), primary_key=True)
+    aircraft_type_id = db.Column(db.Integer, nullable=False)
+    blocked = db.Column(db.LargeBinary, nullable=False)
+
+    flight = db.relationship("Flight", back_populates="seat_map")
+
+    def __repr__(self):
+        return f"<SeatMap flight={self.flight_id} aircraft={self.aircraft_type_id}>"
+
+# one row per sold seat; the unique (flight, seat) pair is what makes seat sales atomic
+class SeatAssignment(db.Model):
+    __tablename__ = "seat_assignment"
 
     id = db.Column(db.Integer, primary_key=True)
-    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"), nullable=False, index=True)
-    row_num = db.Column(db.Integer, nullable=False)
-    seat_letter = db.Column(db.String(1), nullable=False)
-    cabin_class = db.Column(db.String(16), nullable=False)
-    is_blocked = db.Column(db.Boolean, nullable=False, default=False)
+    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"), nullable=False)
+    seat_code = db.Column(db.String(8), nullable=False)
+    booking_ref = db.Column(db.String(32), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     __table_args__ = (
-        db.UniqueConstraint("flight_id", "row_num", "seat_letter", name="uniq_flight_row_letter"),
+        db.UniqueConstraint("flight_id", "seat_code", name="uniq_flight_seat_assignment"),
     )
 
-    flight = db.relationship("Flight", back_populates="seats")
+    def __repr__(self):
+        return f"<SeatAssignment {self.seat_code} flight={self.flight_id} ref={self.booking_ref}>"
+
+# short-lived seat reservation made while a shopper is picking seats (see web/seat_holds.py)
+class SeatHold(db.Model):
+    __tablename__ = "seat_hold"
+
+    id = db.Column(db.Integer, primary_key=True)
+    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"), nullable=False)
+    seat_code = db.Column(db.String(8), nullable=False)
+    hold_token = db.Column(db.String(32), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
 
-    def code(self) -> str:
-        return f"{self.row_num}{self.seat_letter}"
+    __table_args__ = (
+        db.UniqueConstraint("flight_id", "seat_code", name="uniq_flight_seat_hold"),
+    )
 
     def __repr__(self):
-        return f"<Seat {self.code()} {self.cabin_class} flight={self.flight_id}>"
+        return f"<SeatHold {self.seat_code} flight={self.flight_id} until={self.expires_at}>"
+
+# live seats-sold counter per flight and cabin, updated in the booking/cancel/rebook transactions
+class CabinInventory(db.Model):
+    __tablename__ = "cabin_inventory"
+
+    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"), primary_key=True)
+    cabin = db.Column(db.String(16), primary_key=True)
+    capacity = db.Column(db.Integer, nullable=False)
+    sold = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def available(self) -> int:
+        return max(0, self.capacity - self.sold)
+
+    def __repr__(self):
+        return f"<CabinInventory flight={self.flight_id} {self.cabin} {self.sold}/{self.capacity}>"
 
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -184,8 +225,10 @@ class Customer(db.Model):
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey("customer.id"))
-    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"))
+    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"), index=True)
     seat_code = db.Column(db.String(8))    
+    # the online booking this row mirrors (None for bookings entered by staff); its status says if it was cancelled
+    booking_ref = db.Column(db.String(32), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     customer = db.relationship("Customer", back_populates="bookings")
@@ -209,3 +252,97 @@ class BookingRecord(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     flight = db.relationship("Flight")
+
+    # keyset pagination of a user's bookings (newest first), for account and guest-email bookings
+    __table_args__ = (
+        db.Index("ix_booking_record_user_created", "user_id", "created_at", "id"),
+        db.Index("ix_booking_record_email_created", "primary_email", "created_at", "id"),
+    )
+
+
+# bookkeeping for background jobs (e.g. how far the status sweeper has got)
+class JobState(db.Model):
+    __tablename__ = "job_state"
+
+    name = db.Column(db.String(64), primary_key=True)
+    watermark = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<JobState {self.name} watermark={self.watermark}>"
+
+
+# outgoing email / sms, sent by the outbox worker (see web/outbox.py)
+class OutboxMessage(db.Model):
+    __tablename__ = "outbox_message"
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(16), nullable=False)  # "email" or "sms"
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default="pending")  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+    dedupe_key = db.Column(db.String(255), nullable=True, unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<OutboxMessage {self.id} {self.channel} {self.status}>"
+
+
+# a staff status change waiting to be fanned out to the flight's passengers (see web/status_fanout.py)
+class FlightStatusChange(db.Model):
+    __tablename__ = "flight_status_change"
+
+    id = db.Column(db.Integer, primary_key=True)
+    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"), nullable=False, index=True)
+    status = db.Column(db.String(32), nullable=False)
+    note = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<FlightStatusChange flight={self.flight_id} {self.status}>"
+
+
+# people who asked for booking / flight updates from the booking form
+class Subscriber(db.Model):
+    __tablename__ = "subscriber"
+
+    id = db.Column(db.Integer, primary_key=True)
+    fullname = db.Column(db.String(120), nullable=True)
+    email = db.Column(db.String(120), nullable=True)
+    phone = db.Column(db.String(64), nullable=True)
+    flight_id = db.Column(db.Integer, db.ForeignKey("flight.id"), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # NULLs never collide in a unique index, so subscribers without a flight get their own partial index
+    __table_args__ = (
+        db.Index("uniq_subscriber_email_flight", "email", "flight_id", unique=True),
+        db.Index("uniq_subscriber_email_no_flight", "email", unique=True, sqlite_where=db.text("flight_id IS NULL")),
+    )
+
+    def __repr__(self):
+        return f"<Subscriber {self.email} flight={self.flight_id}>"
+
+
+# idempotency keys for payment submissions: the stored result is replayed for duplicates until expires_at
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_key"
+
+    key = db.Column(db.String(64), primary_key=True)
+    endpoint = db.Column(db.String(64), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    response = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key} {self.endpoint}>"
@@ -1,111 +1,167 @@
+import base64
 from datetime import datetime, timedelta
 from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import or_, and_
+from sqlalchemy import and_, or_
 from .models import BookingRecord, Flight
+from .seat_allocation import SeatConflict, claim_seats, release_seats
+from .availability import SoldOut, passenger_cabins, release, reserve
+from .reminders import scheduler as reminder_scheduler
+from .trip_stats import booking_owners, invalidate_trip_stats, tab_filters, trip_stats
 from . import db
 
 bookings_bp = Blueprint("bookings", __name__, url_prefix="/bookings")
 
 
-# builds the My Bookings page from stored records, with demo fallback if none exist
+PAGE_SIZE = 10
+TABS = ("upcoming", "past", "cancelled")
+
+
+# shapes one stored booking for the trip cards
+def _trip(rec, flight, now):
+    passengers = rec.passengers or []
+    pax_list = []
+    for idx, p in enumerate(passengers):
+        chip = p.get("label") or f"P{idx+1}"
+        if chip.lower().startswith("passenger"):
+            chip = f"P{idx+1}"
+        pax_list.append({
+            "label": p.get("label") or f"P{idx+1}",
+            "chip": chip,
+            "name": p.get("fullName") or p.get("name") or p.get("label") or f"Passenger {idx+1}",
+            "class": p.get("classPreference") or p.get("cabin") or "Economy",
+            "seat_pref": p.get("seatPreference") or p.get("position") or "",
+            "meal": p.get("mealPreference") or "Standard",
+            "extra_bags": int(p.get("extraBags") or 0),
+            "seat": p.get("seatCode") or "",
+        })
+
+    depart = flight.depart_time
+    total_paid = (rec.total_paid_cents or 0) / 100
+    extra_bags = sum(p.get("extra_bags", 0) for p in pax_list)
+    included_bags = len(pax_list) * 1
+    total_bags = included_bags + extra_bags
+
+    status_text = rec.status or flight.status or "On time"
+    # the status sweeper persists this; until it runs, just show it
+    if depart and depart <= now and "cancel" not in status_text.lower():
+        status_text = "Departed"
+
+    is_rebook_window = bool(depart and (depart - now) >= timedelta(days=2))
+    flight_available = is_rebook_window and not ((flight.status or "").lower().startswith("cancel"))
+
+    arrival_time = depart + timedelta(hours=3) if depart else None
+
+    return {
+        "origin": flight.origin,
+        "destination": flight.destination,
+        "airline": "SkyWings",
+        "flight_number": f"SW{flight.id:04d}",
+        "departure": depart,
+        "arrival": arrival_time,
+        "booking_ref": rec.booking_ref,
+        "ticket_type": pax_list[0]["class"] if pax_list else "Economy",
+        "total_paid": total_paid,
+        "price": total_paid,
+        "status": status_text,
+        "pax": pax_list,
+        "baggage": {"total": total_bags, "included": included_bags, "extras": extra_bags},
+        "fare_terms": "Free online cancellation up to 2 hours before departure.",
+        "available": flight_available,
+    }
+
+
+# cursor = "<created_at iso>|<id>" of the last card shown, urlsafe base64 so it can go in a query string
+def _encode_cursor(rec):
+    raw = f"{rec.created_at.isoformat() if rec.created_at else ''}|{rec.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        stamp, rec_id = raw.rsplit("|", 1)
+        return (datetime.fromisoformat(stamp) if stamp else None), int(rec_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _sort_key(row):
+    rec = row[0]
+    return (rec.created_at is not None, rec.created_at or datetime.min, rec.id)
+
+
+# one page of a tab, newest booking first, using keyset pagination on (created_at, id).
+# account bookings and guest bookings under the user's email are read separately so each query walks
+# its (owner, created_at, id) index and stops after one page, then the two pages are merged.
+def _page(tab, now, cursor=None, limit=PAGE_SIZE):
+    rows = []
+    for owner in booking_owners(current_user):
+        query = (
+            db.session.query(BookingRecord, Flight)
+            .join(Flight, BookingRecord.flight_id == Flight.id)
+            .filter(owner, tab_filters(now)[tab])
+        )
+        if cursor:
+            created_at, rec_id = cursor
+            if created_at is None:
+                # rows without a timestamp sort last; only the id orders them
+                query = query.filter(BookingRecord.created_at.is_(None), BookingRecord.id < rec_id)
+            else:
+                query = query.filter(or_(
+                    BookingRecord.created_at < created_at,
+                    and_(BookingRecord.created_at == created_at, BookingRecord.id < rec_id),
+                    BookingRecord.created_at.is_(None),
+                ))
+        rows.extend(
+            query.order_by(BookingRecord.created_at.desc(), BookingRecord.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+
+    rows.sort(key=_sort_key, reverse=True)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_cursor(rows[-1][0]) if more else None
+    return [_trip(rec, flight, now) for rec, flight in rows], next_cursor
+
+
+# builds the My Bookings page: the first page of each tab is rendered here, the rest comes from the api on scroll
 @bookings_bp.route("/")
 @login_required
 def my_bookings():
     now = datetime.utcnow()
-    touched = False
-    filters = [BookingRecord.user_id == current_user.id]
-    if current_user.email:
-        filters.append(and_(BookingRecord.user_id.is_(None), BookingRecord.primary_email == current_user.email))
-    criteria = or_(*filters) if len(filters) > 1 else filters[0]
-
-    records = (
-        db.session.query(BookingRecord, Flight)
-        .join(Flight, BookingRecord.flight_id == Flight.id)
-        .filter(criteria)
-        .order_by(BookingRecord.created_at.desc())
-        .all()
-    )
-
-    trips = []
-    for rec, flight in records:
-        passengers = rec.passengers or []
-        pax_list = []
-        for idx, p in enumerate(passengers):
-            chip = p.get("label") or f"P{idx+1}"
-            if chip.lower().startswith("passenger"):
-                chip = f"P{idx+1}"
-            pax_list.append({
-                "label": p.get("label") or f"P{idx+1}",
-                "chip": chip,
-                "name": p.get("fullName") or p.get("name") or p.get("label") or f"Passenger {idx+1}",
-                "class": p.get("classPreference") or p.get("cabin") or "Economy",
-                "seat_pref": p.get("seatPreference") or p.get("position") or "",
-                "meal": p.get("mealPreference") or "Standard",
-                "extra_bags": int(p.get("extraBags") or 0),
-                "seat": p.get("seatCode") or "",
-            })
-
-        depart = flight.depart_time
-        total_paid = (rec.total_paid_cents or 0) / 100
-        extra_bags = sum(p.get("extra_bags", 0) for p in pax_list)
-        included_bags = len(pax_list) * 1
-        total_bags = included_bags + extra_bags
-
-        status_text = rec.status or flight.status or "On time"
-        if depart and depart <= now and "cancel" not in status_text.lower():
-            status_text = "Departed"
-            if rec.status != status_text:
-                rec.status = status_text
-                db.session.add(rec)
-                touched = True
-
-        is_future = bool(depart and depart > now)
-        is_rebook_window = bool(depart and (depart - now) >= timedelta(days=2))
-        flight_available = is_rebook_window and not ((flight.status or "").lower().startswith("cancel"))
-
-        arrival_time = depart + timedelta(hours=3) if depart else None
-
-        trips.append({
-            "origin": flight.origin,
-            "destination": flight.destination,
-            "airline": "SkyWings",
-            "flight_number": f"SW{flight.id:04d}",
-            "departure": depart,
-            "arrival": arrival_time,
-            "booking_ref": rec.booking_ref,
-            "ticket_type": pax_list[0]["class"] if pax_list else "Economy",
-            "total_paid": total_paid,
-            "price": total_paid,
-            "status": status_text,
-            "pax": pax_list,
-            "baggage": {"total": total_bags, "included": included_bags, "extras": extra_bags},
-            "fare_terms": "Free online cancellation up to 2 hours before departure.",
-            "available": flight_available,
-        })
+    bookings, cursors = {}, {}
+    for tab in TABS:
+        bookings[tab], cursors[tab] = _page(tab, now)
 
-    if touched:
-        db.session.commit()
+    stats = trip_stats(current_user, now)
+    counts = {"upcoming": stats["upcoming"], "past": stats["completed"], "cancelled": stats["cancelled"]}
 
-    upcoming, past, cancelled = [], [], []
-    for t in trips:
-        status_text = (t["status"] or "").lower()
-        if "cancel" in status_text:
-            cancelled.append(t)
-        elif t["departure"] and t["departure"] <= now:
-            past.append(t)
-        elif "depart" in status_text:
-            past.append(t)
-        else:
-            upcoming.append(t)
-
-    bookings = {
-        "upcoming": upcoming,
-        "past": past,
-        "cancelled": cancelled,
-    }
+    return render_template("bookings.html", bookings=bookings, cursors=cursors, counts=counts)
+
+
+# next page of a My Bookings tab: ?tab=upcoming|past|cancelled&cursor=<next_cursor>&limit=N
+@bookings_bp.route("/api")
+@login_required
+def bookings_api():
+    tab = request.args.get("tab", "upcoming")
+    if tab not in TABS:
+        return jsonify({"ok": False, "error": "Unknown tab"}), 400
 
-    return render_template("bookings.html", bookings=bookings)
+    cursor = None
+    if request.args.get("cursor"):
+        cursor = _decode_cursor(request.args["cursor"])
+        if cursor is None:
+            return jsonify({"ok": False, "error": "Invalid cursor"}), 400
+    limit = max(1, min(request.args.get("limit", PAGE_SIZE, type=int), 50))
+
+    trips, next_cursor = _page(tab, datetime.utcnow(), cursor, limit)
+    html = render_template("_trip_cards.html", trips=trips, tab=tab)
+    for t in trips:
+        t["departure"] = t["departure"].isoformat() if t["departure"] else None
+        t["arrival"] = t["arrival"].isoformat() if t["arrival"] else None
+    return jsonify({"ok": True, "tab": tab, "trips": trips, "html": html, "next_cursor": next_cursor})
 
 
 # marks a booking as cancelled and optionally records the reason
@@ -128,6 +184,9 @@ def cancel_booking():
     if not rec:
         return jsonify({"ok": False, "error": "Booking not found"}), 404
 
+    if "cancel" in (rec.status or "").lower():
+        return jsonify({"ok": True})
+
     rec.status = "Cancelled"
     if rec.passengers and reason:
         pax = rec.passengers
@@ -137,8 +196,12 @@ def cancel_booking():
                     p.setdefault("notes", [])
                     p["notes"].append(f"Cancellation reason: {reason}")
         rec.passengers = pax
+    release_seats(rec.booking_ref)
+    release(rec.flight_id, passenger_cabins(rec.flight, rec.passengers))
     db.session.add(rec)
     db.session.commit()
+    reminder_scheduler.unschedule(rec.id)
+    invalidate_trip_stats(current_user.id)
     return jsonify({"ok": True})
 
 
@@ -170,9 +233,20 @@ def rebook_booking():
     if flight.status and "cancel" in flight.status.lower():
         return jsonify({"ok": False, "error": "Flight no longer available"}), 400
 
+    # seats were released on cancellation, so they have to be won back
+    if "cancel" in (rec.status or "").lower():
+        seat_codes = [p.get("seatCode") for p in (rec.passengers or []) if isinstance(p, dict)]
+        try:
+            claim_seats(flight, seat_codes, booking_ref=rec.booking_ref)
+            reserve(flight, passenger_cabins(flight, rec.passengers))
+        except (SeatConflict, SoldOut) as e:
+            return jsonify({"ok": False, "error": str(e)}), 409
+
     rec.status = "On time"
     db.session.add(rec)
     db.session.commit()
+    reminder_scheduler.schedule(rec.id, flight.depart_time)
+    invalidate_trip_stats(current_user.id)
     return jsonify({
         "ok": True,
         "price": (rec.total_paid_cents or 0) / 100,
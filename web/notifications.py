@@ -1,52 +1,43 @@
+import os
+import sqlite3
 from flask import Blueprint, request, redirect, url_for, flash
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-from twilio.rest import Client
-from dotenv import load_dotenv
-import os, sqlite3
-
-load_dotenv()
+from sqlalchemy.dialects.sqlite import insert
+from .models import Subscriber
+from .outbox import enqueue, wake_worker
+from . import db
 
 notifications_bp = Blueprint("notifications", __name__)
 
-# load API keys from environment
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
-TWILIO_SID = os.getenv("TWILIO_SID")
-TWILIO_TOKEN = os.getenv("TWILIO_TOKEN")
-TWILIO_PHONE = os.getenv("TWILIO_PHONE")
+LEGACY_DB = "subscribers.db"
 
-# helper for local storage
-def save_subscriber(fullname, email, phone):
-    conn = sqlite3.connect("subscribers.db")
-    conn.execute(
-        "CREATE TABLE IF NOT EXISTS subscribers (id INTEGER PRIMARY KEY AUTOINCREMENT, fullname TEXT, email TEXT, phone TEXT)"
-    )
-    conn.execute(
-        "INSERT INTO subscribers (fullname, email, phone) VALUES (?, ?, ?)",
-        (fullname, email, phone),
-    )
-    conn.commit()
-    conn.close()
 
-def send_email(to_email, subject, html):
-    try:
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        message = Mail(
-            from_email="noreply@skywings.com",
-            to_emails=to_email,
-            subject=subject,
-            html_content=html,
-        )
-        sg.send(message)
-    except Exception as e:
-        print("Email error:", e)
+# stores (or refreshes) a subscriber in the main database; no commit, the caller's transaction covers it
+def save_subscriber(fullname, email, phone, flight_id=None):
+    stmt = insert(Subscriber).values(fullname=fullname, email=email, phone=phone, flight_id=flight_id)
+    if flight_id is None:
+        target = {"index_elements": ["email"], "index_where": Subscriber.flight_id.is_(None)}
+    else:
+        target = {"index_elements": ["email", "flight_id"]}
+    db.session.execute(stmt.on_conflict_do_update(
+        **target,
+        set_={"fullname": stmt.excluded.fullname, "phone": stmt.excluded.phone},
+    ))
+
 
-def send_sms(to_phone, body):
+# one-time copy of the old standalone subscribers.db into the subscriber table
+def import_legacy_subscribers(path=LEGACY_DB):
+    if not os.path.exists(path) or db.session.query(Subscriber.id).first():
+        return
+    conn = sqlite3.connect(path)
     try:
-        client = Client(TWILIO_SID, TWILIO_TOKEN)
-        client.messages.create(from_=TWILIO_PHONE, to=to_phone, body=body)
-    except Exception as e:
-        print("SMS error:", e)
+        rows = conn.execute("SELECT fullname, email, phone FROM subscribers").fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    for fullname, email, phone in rows:
+        save_subscriber(fullname, email, phone)
+    db.session.commit()
 
 @notifications_bp.route("/subscribe", methods=["POST"])
 def subscribe():
@@ -55,9 +46,12 @@ def subscribe():
     phone = request.form.get("phone")
     flight_id = request.form.get("flight_id", type=int)
 
-    save_subscriber(fullname, email, phone)
-    send_email(email, "Booking Confirmed", f"<h3>Thanks {fullname}!</h3><p>Your booking has been confirmed.</p>")
-    send_sms(phone, f"Hey {fullname}, your booking has been confirmed!")
+    save_subscriber(fullname, email, phone, flight_id)
+    # delivered by the outbox worker, not inside this request
+    enqueue("email", email, f"<h3>Thanks {fullname}!</h3><p>Your booking has been confirmed.</p>", subject="Booking Confirmed")
+    enqueue("sms", phone, f"Hey {fullname}, your booking has been confirmed!")
+    db.session.commit()
+    wake_worker()
 
     flash("Booking confirmed! You’ll receive updates soon.", "success")
     try:
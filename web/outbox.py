@@ -0,0 +1,282 @@
+import logging
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import OutboxMessage
+from . import db
+
+log = logging.getLogger(__name__)
+
+# notification outbox.
+# requests only insert outbox_message rows (in their own transaction) and wake the worker; the
+# worker claims due rows in batches, sends them concurrently on a thread pool through the channel's
+# transport, and writes the results back: sent, retried later with exponential backoff, or parked
+# as "dead" after OUTBOX_MAX_ATTEMPTS. a claim is a lease (next_attempt_at moves LEASE ahead), so
+# rows left in "sending" by a crashed worker are picked up again once the lease runs out.
+# OUTBOX_TRANSPORT=auto only sends on channels whose provider keys are set; other channels' messages
+# stay pending (with a warning) until keys are configured. "fake" never delivers anything.
+
+DEFAULT_BATCH = 100
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_ATTEMPTS = 6
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_CAP = timedelta(hours=1)
+LEASE = timedelta(minutes=5)
+CHANNELS = ("email", "sms")
+FAKE_KEEP = 1000
+
+_wake = threading.Event()
+_pool = None
+_pool_lock = threading.Lock()
+_transports = {}
+
+
+class Envelope(NamedTuple):
+    id: int
+    channel: str
+    recipient: str
+    subject: str | None
+    body: str
+    attempts: int
+
+
+class SendGridTransport:
+    def __init__(self, api_key: str, from_email: str):
+        from sendgrid import SendGridAPIClient
+        self.client = SendGridAPIClient(api_key)
+        self.from_email = from_email
+
+    def send(self, msg: Envelope):
+        from sendgrid.helpers.mail import Mail
+        response = self.client.send(Mail(
+            from_email=self.from_email,
+            to_emails=msg.recipient,
+            subject=msg.subject or "",
+            html_content=msg.body,
+        ))
+        if response.status_code >= 400:
+            raise RuntimeError(f"SendGrid returned {response.status_code}")
+
+
+class TwilioTransport:
+    def __init__(self, sid: str, token: str, from_phone: str):
+        from twilio.rest import Client
+        self.client = Client(sid, token)
+        self.from_phone = from_phone
+
+    def send(self, msg: Envelope):
+        self.client.messages.create(from_=self.from_phone, to=msg.recipient, body=msg.body)
+
+
+# keeps the last `keep` messages in memory instead of sending them (local development and tests)
+class FakeTransport:
+    def __init__(self, fail: bool = False, keep: int = FAKE_KEEP):
+        self.fail = fail
+        self.sent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def send(self, msg: Envelope):
+        if self.fail:
+            raise RuntimeError("fake transport failure")
+        with self._lock:
+            self.sent.append(msg)
+
+
+# swaps the transport for a channel ("email" / "sms")
+def register_transport(channel: str, transport):
+    _transports[channel] = transport
+
+
+# None means the channel can't send yet: its messages are left pending instead of being marked sent
+def _build_transport(channel: str):
+    cfg = current_app.config
+    mode = cfg.get("OUTBOX_TRANSPORT", "auto")
+    if mode == "fake":
+        log.info("outbox: using the fake %s transport", channel)
+        return FakeTransport()
+    if channel == "email" and cfg.get("SENDGRID_API_KEY"):
+        return SendGridTransport(cfg["SENDGRID_API_KEY"], cfg.get("MAIL_FROM", "noreply@skywings.com"))
+    if channel == "sms" and cfg.get("TWILIO_SID") and cfg.get("TWILIO_TOKEN"):
+        return TwilioTransport(cfg["TWILIO_SID"], cfg["TWILIO_TOKEN"], cfg.get("TWILIO_PHONE"))
+    if mode == "live":
+        raise RuntimeError(f"No credentials configured for the {channel} transport")
+    log.warning("outbox: no credentials for the %s transport, leaving %s messages pending", channel, channel)
+    return None
+
+
+def transport_for(channel: str):
+    if channel not in _transports:
+        _transports[channel] = _build_transport(channel)
+    return _transports[channel]
+
+
+# channels worth claiming messages for; a transport that fails to build is still claimed so each
+# message records the error (and eventually goes dead) instead of waiting silently
+def _sendable_channels():
+    channels = []
+    for channel in sorted(set(CHANNELS) | set(_transports)):
+        try:
+            if transport_for(channel) is None:
+                continue
+        except Exception:
+            pass
+        channels.append(channel)
+    return channels
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = current_app.config.get("OUTBOX_WORKERS", DEFAULT_WORKERS)
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="outbox")
+        return _pool
+
+
+def _message_row(channel, recipient, body, subject=None, dedupe_key=None):
+    return {
+        "channel": channel,
+        "recipient": recipient,
+        "subject": subject,
+        "body": body,
+        "dedupe_key": dedupe_key,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": datetime.utcnow(),
+    }
+
+
+# queues many messages in one statement (no commit); rows whose dedupe_key already exists are skipped
+def enqueue_many(messages):
+    rows = [_message_row(**m) for m in messages if m.get("recipient")]
+    if not rows:
+        return
+    stmt = insert(OutboxMessage).on_conflict_do_nothing(index_elements=["dedupe_key"])
+    db.session.execute(stmt, rows)
+
+
+# queues one email / sms (no commit)
+def enqueue(channel, recipient, body, subject=None, dedupe_key=None):
+    enqueue_many([{
+        "channel": channel,
+        "recipient": recipient,
+        "body": body,
+        "subject": subject,
+        "dedupe_key": dedupe_key,
+    }])
+
+
+# lets the worker start on freshly committed messages without waiting for its next poll
+def wake_worker():
+    _wake.set()
+
+
+def wake_event():
+    return _wake
+
+
+def _backoff(attempts: int) -> timedelta:
+    delay = min(BACKOFF_BASE * (2 ** max(attempts - 1, 0)), BACKOFF_CAP)
+    return delay * (1 + random.random() / 4)
+
+
+# takes up to `limit` due messages on `channels` and leases them to this worker
+def _claim(now: datetime, limit: int, channels):
+    due = (
+        select(OutboxMessage.id)
+        .where(
+            OutboxMessage.status.in_(("pending", "sending")),
+            OutboxMessage.next_attempt_at <= now,
+            OutboxMessage.channel.in_(channels),
+        )
+        .order_by(OutboxMessage.next_attempt_at)
+        .limit(limit)
+    )
+    rows = db.session.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(due.scalar_subquery()), OutboxMessage.next_attempt_at <= now)
+        .values(status="sending", next_attempt_at=now + LEASE, attempts=OutboxMessage.attempts + 1)
+        .returning(
+            OutboxMessage.id,
+            OutboxMessage.channel,
+            OutboxMessage.recipient,
+            OutboxMessage.subject,
+            OutboxMessage.body,
+            OutboxMessage.attempts,
+        )
+    ).all()
+    db.session.commit()
+    return [Envelope(*r) for r in rows]
+
+
+def _send(transport, msg: Envelope):
+    try:
+        transport.send(msg)
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+# one pass of the worker: claim, send concurrently, record outcomes. returns the number of messages handled.
+def process_outbox(now: datetime | None = None, batch: int | None = None, max_batches: int = 10) -> int:
+    batch = batch or current_app.config.get("OUTBOX_BATCH", DEFAULT_BATCH)
+    max_attempts = current_app.config.get("OUTBOX_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+    handled = 0
+    channels = _sendable_channels()
+    if not channels:
+        return 0
+
+    for _ in range(max_batches):
+        started = now or datetime.utcnow()
+        messages = _claim(started, batch, channels)
+        if not messages:
+            break
+
+        pool = _executor()
+        futures = []
+        for msg in messages:
+            try:
+                transport = transport_for(msg.channel)
+            except Exception as e:
+                futures.append((msg, None, f"{type(e).__name__}: {e}"))
+                continue
+            futures.append((msg, pool.submit(_send, transport, msg), None))
+
+        finished = datetime.utcnow()
+        results = []
+        for msg, future, error in futures:
+            if future is not None:
+                error = future.result()
+            if error is None:
+                results.append({"id": msg.id, "status": "sent", "sent_at": finished, "last_error": None})
+            elif msg.attempts >= max_attempts:
+                log.warning("outbox message %s dead after %s attempts: %s", msg.id, msg.attempts, error)
+                results.append({"id": msg.id, "status": "dead", "last_error": error})
+            else:
+                results.append({
+                    "id": msg.id,
+                    "status": "pending",
+                    "next_attempt_at": finished + _backoff(msg.attempts),
+                    "last_error": error,
+                })
+
+        # bulk UPDATE by primary key, grouped by the columns each outcome sets
+        by_shape = {}
+        for r in results:
+            by_shape.setdefault(tuple(sorted(r)), []).append(r)
+        for rows in by_shape.values():
+            db.session.execute(update(OutboxMessage), rows)
+        db.session.commit()
+
+        handled += len(messages)
+        if len(messages) < batch:
+            break
+    return handled
@@ -2,28 +2,23 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from datetime import datetime
 from typing import Any, Dict, List, Tuple
 from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
 from .models import Flight, Customer, Booking, BookingRecord
-from . import db
+from .seat_allocation import SeatConflict, claim_seats
+from .availability import SoldOut, passenger_cabins, reserve
+from .seat_holds import convert_holds, hold_token
+from .customer_search import index_bookings
+from .booking_refs import DuplicateBookingRef, next_booking_ref
+from .fares import BAG_CENTS, passenger_mix, tax_rate_for
+from .seat_pricing import seat_cabin, seat_fee_cents, seat_fees
+from .trip_stats import invalidate_trip_stats
+from .reminders import scheduler as reminder_scheduler
+from . import db, idempotency
 
 payments = Blueprint("payments", __name__, url_prefix="/payments")
 
-# tax rates for payment calculations
-TAX_TABLE: dict[str, float] = {
-    "Canada": 0.13, "United States": 0.08, "Mexico": 0.16, "Bahamas": 0.12, "Bermuda": 0.075,
-    "Jamaica": 0.15, "Dominican Republic": 0.18, "Cuba": 0.14, "Puerto Rico": 0.115,
-    "Belize": 0.12, "Costa Rica": 0.13, "Panama": 0.07, "Guatemala": 0.12, "Honduras": 0.15,
-    "El Salvador": 0.13, "Nicaragua": 0.15, "Trinidad and Tobago": 0.12, "Barbados": 0.175,
-    "Aruba": 0.18, "Cayman Islands": 0.0, "Brazil": 0.17, "Argentina": 0.21, "Chile": 0.19,
-    "Peru": 0.18, "Colombia": 0.19, "Ecuador": 0.12, "Uruguay": 0.22, "Paraguay": 0.1,
-    "Bolivia": 0.13, "Venezuela": 0.16, "United Kingdom": 0.2, "Ireland": 0.23, "France": 0.2,
-    "Germany": 0.19, "Spain": 0.21, "Italy": 0.22, "Portugal": 0.23, "Netherlands": 0.21,
-    "Switzerland": 0.081, "Greece": 0.24, "Turkey": 0.18, "United Arab Emirates": 0.05,
-    "Qatar": 0.05, "Saudi Arabia": 0.15, "Egypt": 0.14, "South Africa": 0.15,
-    "Kenya": 0.16, "Morocco": 0.2, "India": 0.18, "China": 0.13, "Japan": 0.1, "South Korea": 0.1,
-    "Singapore": 0.09, "Thailand": 0.07, "Vietnam": 0.1, "Malaysia": 0.08, "Indonesia": 0.11,
-    "Philippines": 0.12, "Australia": 0.1, "New Zealand": 0.15, "Fiji": 0.15,
-}
-DEFAULT_TAX_RATE = 0.13
+# tries per payment when a booking reference turns out to be taken already (see booking_refs)
+REF_ATTEMPTS = 3
 
 # sets up payment page
 @payments.route("/<int:flight_id>", methods=["GET"])
@@ -37,37 +32,58 @@ def payments_page(flight_id: int):
         "payments.html",
         flight=flight,
         flight_id=flight_id,
+        idempotency_key=idempotency.new_key(),
         passenger_count=passenger_count,
+        seat_fees=seat_fees(flight),
+        class_map=flight.aircraft_type.class_map if flight.aircraft_type else None,
         currency_code="CAD",
     )
 
+# runs a payment once per idempotency key; duplicates (double clicks, retries) replay the first result
+def _pay(endpoint: str, flight_id: int | None, done_message: str):
+    seat_payload = request.form.get("seat_data") or "{}"
+    billing_country = (request.form.get("country") or "").strip() or None
+    key = request.form.get("idempotency_key")
+    for attempt in range(REF_ATTEMPTS):
+        try:
+            claim, replay = idempotency.begin(key, endpoint, idempotency.fingerprint(flight_id, seat_payload, billing_country))
+        except idempotency.KeyReused as e:
+            flash(str(e), "warning")
+            return redirect(url_for("search.search"))
+        if replay is not None:
+            flash(done_message, "success")
+            return redirect(url_for("search.search"))
+
+        try:
+            _complete_booking(flight_id, seat_payload, billing_country=billing_country, idempotency_claim=claim)
+        except (SeatConflict, SoldOut) as e:
+            flash(f"{e} Please pick different seats.", "danger")
+            return redirect(url_for("seats.seat_page", flight_id=flight_id))
+        except DuplicateBookingRef:
+            # everything was rolled back, key claim included; run the whole booking again with a new ref
+            if attempt + 1 == REF_ATTEMPTS:
+                raise
+            continue
+        break
+    flash(done_message, "success")
+    return redirect(url_for("search.search"))
+
+
 # payment support for both card and PayPal (Not real payments as we cant validate this assignment as a business with stripe/paypal)
 @payments.route("/submit-card", methods=["POST"])
 def submit_card():
     flight_id = request.form.get("flight_id", type=int)
-    seat_payload = request.form.get("seat_data") or "{}"
-    billing_country = (request.form.get("country") or "").strip() or None
-    _complete_booking(flight_id, seat_payload, billing_country=billing_country)
-    flash("Payment completed (card).", "success")
-    return redirect(url_for("search.search"))
+    return _pay("submit_card", flight_id, "Payment completed (card).")
 
 @payments.route("/mock-paypal/<int:flight_id>", methods=["POST", "GET"])
 def mock_paypal(flight_id: int):
     if request.method == "POST":
-        seat_payload = request.form.get("seat_data") or "{}"
-        billing_country = (request.form.get("country") or "").strip() or None
-        _complete_booking(flight_id, seat_payload, billing_country=billing_country)
+        return _pay("mock_paypal", flight_id, "Payment completed (PayPal – mock).")
     flash("Payment completed (PayPal – mock).", "success")
     return redirect(url_for("search.search"))
 
 payments_bp = payments
 
-# gets tax rate based on country selected in billing info
-def _tax_rate_for(country: str | None) -> float:
-    if not country:
-        return DEFAULT_TAX_RATE
-    return TAX_TABLE.get(country, DEFAULT_TAX_RATE)
-
 # make sure passenger data is set up so each entry has labels, seat info, class, and contact.
 def _parse_passenger_list(raw: Any, fallback_pax: int) -> List[Dict[str, Any]]:
     passengers = raw if isinstance(raw, list) else []
@@ -95,27 +111,13 @@ def _parse_passenger_list(raw: Any, fallback_pax: int) -> List[Dict[str, Any]]:
     return normalized
 
 # calculates total price based on base price, num of passengers, upgrades, extra bags, and tax
-def _compute_total_cents(base_price_cents: int, passengers: List[Dict[str, Any]], country: str | None) -> Tuple[int, Dict[str, Any]]:
-    pax_count = max(1, len(passengers))
+def _compute_total_cents(base_price_cents: int, passengers: List[Dict[str, Any]], country: str | None, seat_cents: int = 0) -> Tuple[int, Dict[str, Any]]:
+    pax_count, upgrade_cents, extra_bags = passenger_mix(passengers)
     base_fare_cents = (base_price_cents or 0) * pax_count
+    baggage_cents = extra_bags * BAG_CENTS
 
-    upgrade_cents = 0
-    extra_bags = 0
-    for p in passengers:
-        cls = (p.get("classPreference") or p.get("cabin") or "").lower()
-        if "first" in cls:
-            upgrade_cents += 90000  # $900 upgrade for First
-        elif "business" in cls:
-            upgrade_cents += 45000  # $450 upgrade for Business
-        try:
-            bags = int(p.get("extraBags") or 0)
-        except (TypeError, ValueError):
-            bags = 0
-        extra_bags += max(0, bags)
-    baggage_cents = extra_bags * 5000  # $50 per extra bag
-
-    subtotal_cents = base_fare_cents + upgrade_cents + baggage_cents
-    tax_rate = _tax_rate_for(country)
+    subtotal_cents = base_fare_cents + upgrade_cents + baggage_cents + seat_cents
+    tax_rate = tax_rate_for(country)
     tax_cents = round(subtotal_cents * tax_rate)
     total_cents = subtotal_cents + tax_cents
 
@@ -125,12 +127,14 @@ def _compute_total_cents(base_price_cents: int, passengers: List[Dict[str, Any]]
         "upgrade_cents": upgrade_cents,
         "extra_bags": extra_bags,
         "baggage_cents": baggage_cents,
+        "seat_cents": seat_cents,
         "tax_rate": tax_rate,
         "tax_cents": tax_cents,
     }
 
 # finalizes booking after payment and stores booking details for a booking reference 
-def _complete_booking(flight_id: int | None, seat_payload: str, billing_country: str | None = None):
+# raises SeatConflict / SoldOut (nothing is saved) if a selected seat or the cabin sold out in the meantime
+def _complete_booking(flight_id: int | None, seat_payload: str, billing_country: str | None = None, idempotency_claim=None):
     if not flight_id:
         return
     flight = Flight.query.get(flight_id)
@@ -152,10 +156,20 @@ def _complete_booking(flight_id: int | None, seat_payload: str, billing_country:
     except (TypeError, ValueError):
         pax_requested = 1
     passengers = _parse_passenger_list(parsed.get("passengers"), pax_requested)
+    # the seat, not the class picked on the traveller form, decides the cabin (and its upgrade)
+    for p in passengers:
+        cabin = seat_cabin(flight, p.get("seatCode"))
+        if cabin:
+            p["cabin"] = p["classPreference"] = cabin
 
     # build a booking reference
-    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    booking_ref = f"BK-{flight_id}-{stamp}"
+    booking_ref = next_booking_ref()
+
+    # turn this shopper's holds into sold seats; a seat held or sold by anyone else aborts the whole booking
+    seat_codes = [p.get("seatCode") for p in passengers]
+    convert_holds(flight, seat_codes, hold_token())
+    claim_seats(flight, seat_codes, booking_ref=booking_ref)
+    reserve(flight, passenger_cabins(flight, passengers))
 
     primary = passengers[0] if passengers else {}
     full_name = primary.get("fullName") or primary.get("name") or primary.get("label") or "Primary Passenger"
@@ -169,16 +183,22 @@ def _complete_booking(flight_id: int | None, seat_payload: str, billing_country:
     if not cust:
         first, *rest = (full_name or "").split(" ", 1)
         last = rest[0] if rest else ""
-        cust = Customer(first_name=first or "Guest", last_name=last or "Passenger", email=email or f"guest-{stamp}@example.com", phone=phone)
+        cust = Customer(first_name=first or "Guest", last_name=last or "Passenger", email=email or f"guest-{booking_ref.lower()}@example.com", phone=phone)
         db.session.add(cust)
         db.session.flush()
 
     # support for staff view
+    staff_bookings = []
     for p in passengers:
         seat_code = p.get("seatCode") or ""
-        db.session.add(Booking(customer_id=cust.id, flight_id=flight_id, seat_code=seat_code))
+        staff_bookings.append(Booking(customer_id=cust.id, flight_id=flight_id, seat_code=seat_code, booking_ref=booking_ref))
+    db.session.add_all(staff_bookings)
+    db.session.flush()
+    index_bookings(staff_bookings, cust, booking_ref=booking_ref)
 
-    total_paid_cents, _fare_details = _compute_total_cents(flight.price_cents or 0, passengers, billing_country)
+    total_paid_cents, _fare_details = _compute_total_cents(
+        flight.price_cents or 0, passengers, billing_country, seat_fee_cents(flight, seat_codes)
+    )
 
     status_text = flight.status or "On time"
     if flight.depart_time and flight.depart_time <= datetime.utcnow() and "cancel" not in (status_text or "").lower():
@@ -197,4 +217,15 @@ def _complete_booking(flight_id: int | None, seat_payload: str, billing_country:
         passengers=passengers,
     )
     db.session.add(record)
-    db.session.commit()
+    if idempotency_claim is not None:
+        idempotency_claim.response = {"booking_ref": booking_ref}
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if BookingRecord.query.filter_by(booking_ref=booking_ref).first() is not None:
+            raise DuplicateBookingRef(booking_ref)
+        raise
+    reminder_scheduler.schedule(record.id, flight.depart_time)
+    if current_user and current_user.is_authenticated:
+        invalidate_trip_stats(current_user.id)
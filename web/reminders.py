@@ -0,0 +1,177 @@
+import heapq
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from .models import BookingRecord, Flight
+from .outbox import enqueue_many, wake_worker
+from . import db
+
+# departure reminders, 24h and 2h before a flight leaves.
+# pending reminders live in an in-process min-heap of small (fire_at, booking_record_id, kind) tuples.
+# it is built once from the database (future departures only, through the flight.depart_time index)
+# and then kept up to date as bookings are made, rebooked or cancelled. each tick only pops what is
+# due and re-checks those bookings in one query, so cancelled bookings and moved flights drop out
+# without scanning anything. outbox dedupe keys make it safe for several processes to send.
+
+REMINDERS = (("24h", timedelta(hours=24)), ("2h", timedelta(hours=2)))
+# reminders that came due shortly before a restart are still sent
+GRACE = timedelta(minutes=15)
+BUILD_CHUNK = 5000
+
+
+class ReminderScheduler:
+    def __init__(self):
+        self._heap = []
+        self._pending = Counter()  # record_id -> its entries still in the heap
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self.built = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _entries(self, record_id: int, depart: datetime, now: datetime):
+        for kind, offset in REMINDERS:
+            fire_at = depart - offset
+            if fire_at >= now - GRACE and depart > now:
+                yield (fire_at, record_id, kind)
+
+    # loads every reminder still to come; departures are streamed in chunks straight off the index
+    def rebuild(self, now: datetime | None = None):
+        now = now or datetime.utcnow()
+        stmt = (
+            select(BookingRecord.id, Flight.depart_time)
+            .join(Flight, BookingRecord.flight_id == Flight.id)
+            .where(
+                Flight.depart_time > now - GRACE,
+                ~func.lower(func.coalesce(BookingRecord.status, "")).contains("cancel"),
+            )
+            .execution_options(yield_per=BUILD_CHUNK)
+        )
+        heap = []
+        for record_id, depart in db.session.execute(stmt):
+            heap.extend(self._entries(record_id, depart, now))
+        heapq.heapify(heap)
+        pending = Counter(record_id for _, record_id, _ in heap)
+        with self._lock:
+            self._heap = heap
+            self._pending = pending
+            self._cancelled.clear()
+            self.built = True
+        return len(heap)
+
+    # adds a new (or rebooked) booking's reminders; a no-op until the heap has been built
+    def schedule(self, record_id: int, depart: datetime | None, now: datetime | None = None, kinds=None):
+        if not self.built or depart is None:
+            return
+        now = now or datetime.utcnow()
+        with self._lock:
+            self._cancelled.discard(record_id)
+            for entry in self._entries(record_id, depart, now):
+                if kinds is None or entry[2] in kinds:
+                    heapq.heappush(self._heap, entry)
+                    self._pending[record_id] += 1
+
+    # cancelled bookings are skipped when their reminders come up (lazy deletion); the mark goes
+    # once the booking's last entry has left the heap
+    def unschedule(self, record_id: int):
+        if not self.built:
+            return
+        with self._lock:
+            if self._pending[record_id]:
+                self._cancelled.add(record_id)
+            else:
+                del self._pending[record_id]
+
+    def pop_due(self, now: datetime):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, record_id, kind = heapq.heappop(self._heap)
+                self._pending[record_id] -= 1
+                cancelled = record_id in self._cancelled
+                if not self._pending[record_id]:
+                    del self._pending[record_id]
+                    self._cancelled.discard(record_id)
+                if not cancelled:
+                    due.append((fire_at, record_id, kind))
+        return due
+
+
+scheduler = ReminderScheduler()
+
+
+def _messages(rec, flight, kind):
+    code = f"SW{flight.id:04d}"
+    when = flight.depart_time.strftime("%b %d, %Y %H:%M")
+    hours = "24 hours" if kind == "24h" else "2 hours"
+    stamp = flight.depart_time.isoformat()
+    messages = []
+    if rec.primary_email:
+        messages.append({
+            "channel": "email",
+            "recipient": rec.primary_email,
+            "subject": f"Reminder: flight {code} departs in {hours}",
+            "body": (
+                f"<h3>Your flight leaves in {hours}</h3>"
+                f"<p>{code} {flight.origin} → {flight.destination}, departing {when}. "
+                f"Booking reference {rec.booking_ref}.</p>"
+            ),
+            "dedupe_key": f"reminder:{rec.id}:{kind}:email:{stamp}",
+        })
+    if rec.primary_phone:
+        messages.append({
+            "channel": "sms",
+            "recipient": rec.primary_phone,
+            "body": f"SkyWings reminder: {code} {flight.origin}-{flight.destination} departs {when} ({rec.booking_ref}).",
+            "dedupe_key": f"reminder:{rec.id}:{kind}:sms:{stamp}",
+        })
+    return messages
+
+
+# one tick: queues the reminders that are due. returns the number of messages queued.
+def send_due_reminders(now: datetime | None = None) -> int:
+    now = now or datetime.utcnow()
+    if not scheduler.built:
+        scheduler.rebuild(now)
+
+    due = scheduler.pop_due(now)
+    if not due:
+        return 0
+
+    ids = sorted({record_id for _, record_id, _ in due})
+    by_id = {}
+    for i in range(0, len(ids), 500):
+        rows = (
+            db.session.query(BookingRecord, Flight)
+            .join(Flight, BookingRecord.flight_id == Flight.id)
+            .filter(BookingRecord.id.in_(ids[i:i + 500]))
+            .all()
+        )
+        by_id.update((rec.id, (rec, flight)) for rec, flight in rows)
+
+    messages = []
+    for fire_at, record_id, kind in due:
+        found = by_id.get(record_id)
+        if not found:
+            continue
+        rec, flight = found
+        if "cancel" in (rec.status or "").lower() or not flight.depart_time:
+            continue
+        # the flight was moved since this reminder was scheduled: put it back at the new time
+        offset = dict(REMINDERS)[kind]
+        if flight.depart_time - offset != fire_at:
+            scheduler.schedule(record_id, flight.depart_time, now, kinds=(kind,))
+            continue
+        if flight.depart_time <= now:
+            continue
+        messages.extend(_messages(rec, flight, kind))
+
+    enqueue_many(messages)
+    db.session.commit()
+    if messages:
+        wake_worker()
+    return len(messages)
@@ -1,6 +1,13 @@
-from flask import Blueprint, render_template, request
-from datetime import datetime
+from flask import Blueprint, render_template, request, jsonify
+from datetime import datetime, timedelta
 from .models import Flight
+from .search_index import flight_index
+from .connections import find_connections
+from .availability import availability_for
+from .fares import MAX_BASE_CENTS, MAX_EXTRA_BAGS, extra_bags_for, quote_batch
+from . import db
+
+MAX_QUOTES = 200_000
 
 # handles the flight search form and returns matching flights
 
@@ -12,21 +19,168 @@ def search():
     q_dest   = (request.args.get("destination") or "").upper().strip()
     q_depart = request.args.get("depart")
 
-    query = Flight.query
-    if q_origin:
-        query = query.filter(Flight.origin == q_origin)
-    if q_dest:
-        query = query.filter(Flight.destination == q_dest)
+    depart_from = None
     if q_depart:
         try:
-            d = datetime.fromisoformat(q_depart)
-            end = d.replace(hour=23, minute=59, second=59)
-            query = query.filter(Flight.depart_time >= d, Flight.depart_time <= end)
+            depart_from = datetime.fromisoformat(q_depart)
         except Exception:
             pass
 
     flights = None
-    if q_origin or q_dest or q_depart:
+    connections = None
+    if q_origin and q_dest:
+        # route searches (the normal form submit) are served from the in-memory index
+        if depart_from:
+            flights = flight_index.departures(q_origin, q_dest, depart_from.date(), after=depart_from)
+            if not request.args.get("nonstop"):
+                connections, _ = find_connections(q_origin, q_dest, depart_from.date(), limit=10)
+        else:
+            flights = flight_index.route(q_origin, q_dest)
+    elif q_origin or q_dest or q_depart:
+        query = Flight.query
+        if q_origin:
+            query = query.filter(Flight.origin == q_origin)
+        if q_dest:
+            query = query.filter(Flight.destination == q_dest)
+        if depart_from:
+            end = depart_from.replace(hour=23, minute=59, second=59)
+            query = query.filter(Flight.depart_time >= depart_from, Flight.depart_time <= end)
         flights = query.order_by(Flight.depart_time.asc()).all()
 
-    return render_template("flight_search.html", flights=flights)
+    availability = availability_for(flights) if flights else {}
+
+    return render_template(
+        "flight_search.html",
+        flights=flights,
+        connections=connections,
+        availability=availability,
+    )
+
+
+# one- and two-stop itineraries for a route and day, ranked by total price or total duration
+@search_bp.route("/api/connections", methods=["GET"])
+def connections_api():
+    q_origin = (request.args.get("origin") or "").upper().strip()
+    q_dest = (request.args.get("destination") or "").upper().strip()
+    q_depart = request.args.get("depart") or ""
+    if not q_origin or not q_dest:
+        return jsonify({"error": "origin_and_destination_required"}), 400
+    try:
+        day = datetime.fromisoformat(q_depart).date()
+    except ValueError:
+        return jsonify({"error": "invalid_depart"}), 400
+
+    max_stops = max(1, min(request.args.get("max_stops", default=2, type=int) or 2, 2))
+    sort = "duration" if request.args.get("sort") == "duration" else "price"
+    limit = max(1, min(request.args.get("limit", default=20, type=int) or 20, 100))
+    min_conn = request.args.get("min_connection", default=45, type=int) or 45
+    max_conn = request.args.get("max_connection", default=360, type=int) or 360
+
+    itineraries, truncated = find_connections(
+        q_origin,
+        q_dest,
+        day,
+        max_stops=max_stops,
+        sort=sort,
+        limit=limit,
+        min_connection=timedelta(minutes=min_conn),
+        max_connection=timedelta(minutes=max(max_conn, min_conn)),
+    )
+    return jsonify({
+        "origin": q_origin,
+        "destination": q_dest,
+        "depart": day.isoformat(),
+        "sort": sort,
+        "truncated": truncated,
+        "itineraries": [it.to_dict() for it in itineraries],
+    })
+
+
+# lowest fare per day for a route, either +/- `window` days around `depart` or a whole `month` (YYYY-MM)
+@search_bp.route("/api/fare-calendar", methods=["GET"])
+def fare_calendar_api():
+    q_origin = (request.args.get("origin") or "").upper().strip()
+    q_dest = (request.args.get("destination") or "").upper().strip()
+    if not q_origin or not q_dest:
+        return jsonify({"error": "origin_and_destination_required"}), 400
+
+    q_month = request.args.get("month")
+    try:
+        if q_month:
+            start = datetime.strptime(q_month, "%Y-%m").date()
+            end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        else:
+            center = datetime.fromisoformat(request.args.get("depart") or "").date()
+            window = max(0, min(request.args.get("window", default=3, type=int) or 0, 15))
+            start, end = center - timedelta(days=window), center + timedelta(days=window)
+    except ValueError:
+        return jsonify({"error": "invalid_date"}), 400
+
+    days = flight_index.daily_minimums(q_origin, q_dest, start, end)
+    return jsonify({
+        "origin": q_origin,
+        "destination": q_dest,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": [
+            {"date": d.isoformat(), "min_price_cents": low}
+            for d, low in days.items()
+        ],
+    })
+
+
+# all-in prices (fare + upgrades + bags + tax, in cents) for every flight x passenger mix x country.
+# body: {"flight_ids": [...] or "base_prices": [...], "mixes": [[passenger, ...], ...], "countries": [...]}
+# a passenger is the same dict checkout takes (classPreference / cabin, extraBags).
+@search_bp.route("/api/fare-quotes", methods=["POST"])
+def fare_quotes_api():
+    body = request.get_json(silent=True) or {}
+    mixes = body.get("mixes") or [[{}]]
+    countries = body.get("countries") or [None]
+    flight_ids = body.get("flight_ids")
+    base_prices = body.get("base_prices")
+
+    if not isinstance(mixes, list) or not all(isinstance(m, list) and all(isinstance(p, dict) for p in m) for m in mixes):
+        return jsonify({"error": "invalid_mixes"}), 400
+    if any(extra_bags_for(p) > MAX_EXTRA_BAGS for m in mixes for p in m):
+        return jsonify({"error": "invalid_mixes", "max_extra_bags": MAX_EXTRA_BAGS}), 400
+    if not isinstance(countries, list) or not all(c is None or isinstance(c, str) for c in countries):
+        return jsonify({"error": "invalid_countries"}), 400
+
+    if flight_ids is not None:
+        try:
+            flight_ids = [int(i) for i in flight_ids]
+        except (TypeError, ValueError):
+            return jsonify({"error": "invalid_flight_ids"}), 400
+        if not all(0 < i < 2**63 for i in flight_ids):
+            return jsonify({"error": "invalid_flight_ids"}), 400
+        prices = {}
+        for i in range(0, len(flight_ids), 500):
+            chunk = flight_ids[i:i + 500]
+            prices.update(
+                db.session.query(Flight.id, Flight.price_cents).filter(Flight.id.in_(chunk)).all()
+            )
+        missing = [i for i in flight_ids if i not in prices]
+        if missing:
+            return jsonify({"error": "unknown_flights", "flight_ids": missing[:50]}), 404
+        base_prices = [prices[i] for i in flight_ids]
+    elif isinstance(base_prices, list):
+        try:
+            base_prices = [int(p or 0) for p in base_prices]
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({"error": "invalid_base_prices"}), 400
+        if not all(0 <= p <= MAX_BASE_CENTS for p in base_prices):
+            return jsonify({"error": "invalid_base_prices", "max": MAX_BASE_CENTS}), 400
+    else:
+        return jsonify({"error": "flight_ids_or_base_prices_required"}), 400
+
+    if len(base_prices) * len(mixes) * len(countries) > MAX_QUOTES:
+        return jsonify({"error": "too_many_quotes", "max": MAX_QUOTES}), 400
+
+    totals = quote_batch(base_prices, mixes, countries)
+    return jsonify({
+        "flight_ids": flight_ids,
+        "base_prices": base_prices,
+        "countries": countries,
+        "quotes": totals.tolist(),
+    })
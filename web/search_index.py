@@ -0,0 +1,200 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from flask import current_app
+
+from . import db
+
+# in-memory route/date index for flight search.
+# flights are bucketed by (origin, destination, departure day) and kept sorted by departure time,
+# so a search is a dict lookup plus a bisect instead of a query over the whole flight table.
+# the index is built lazily on first use, patched in place when this process changes a flight,
+# and rebuilt once it is older than SEARCH_INDEX_MAX_AGE seconds to pick up other processes' writes.
+# readers take the same lock as in-place patches and hand back copies, never the live buckets.
+
+DEFAULT_MAX_AGE = 300
+
+
+# the slice of a flight that search results need (attribute names match the Flight model)
+class FlightRow(NamedTuple):
+    depart_time: datetime
+    id: int
+    origin: str
+    destination: str
+    price_cents: int
+    status: str | None
+    aircraft_type_id: int | None
+
+
+def _row_for(flight) -> FlightRow:
+    return FlightRow(
+        flight.depart_time,
+        flight.id,
+        flight.origin,
+        flight.destination,
+        flight.price_cents or 0,
+        flight.status,
+        flight.aircraft_type_id,
+    )
+
+
+# cheapest non-cancelled fare in a bucket
+def _cheapest(bucket):
+    prices = [row.price_cents for row in bucket if "cancel" not in (row.status or "").lower()]
+    return min(prices) if prices else None
+
+
+class FlightSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[tuple[str, str, date], list[FlightRow]] = {}
+        self._keys: dict[int, tuple[str, str, date]] = {}
+        self._graph: dict[str, set[str]] = {}
+        self._daily_min: dict[tuple[str, str, date], int] = {}
+        self._built_at: float | None = None
+
+    def _max_age(self) -> float:
+        return float(current_app.config.get("SEARCH_INDEX_MAX_AGE", DEFAULT_MAX_AGE))
+
+    def rebuild(self):
+        from .models import Flight
+
+        rows = db.session.query(
+            Flight.depart_time,
+            Flight.id,
+            Flight.origin,
+            Flight.destination,
+            Flight.price_cents,
+            Flight.status,
+            Flight.aircraft_type_id,
+        ).all()
+
+        buckets: dict[tuple[str, str, date], list[FlightRow]] = {}
+        keys: dict[int, tuple[str, str, date]] = {}
+        graph: dict[str, set[str]] = {}
+        for r in rows:
+            row = FlightRow(r[0], r[1], r[2], r[3], r[4] or 0, r[5], r[6])
+            key = (row.origin, row.destination, row.depart_time.date())
+            buckets.setdefault(key, []).append(row)
+            keys[row.id] = key
+            graph.setdefault(row.origin, set()).add(row.destination)
+        for bucket in buckets.values():
+            bucket.sort()
+        daily_min = {}
+        for key, bucket in buckets.items():
+            low = _cheapest(bucket)
+            if low is not None:
+                daily_min[key] = low
+
+        # swap in whole structures so concurrent readers never see a half-built index
+        with self._lock:
+            self._buckets = buckets
+            self._keys = keys
+            self._graph = graph
+            self._daily_min = daily_min
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self._max_age():
+            self.rebuild()
+
+    def invalidate(self):
+        self._built_at = None
+
+    # adds or replaces one flight (after a status/price change or a new flight in this process)
+    def upsert(self, flight):
+        if self._built_at is None:
+            return
+        row = _row_for(flight)
+        key = (row.origin, row.destination, row.depart_time.date())
+        with self._lock:
+            self._discard(row.id)
+            insort(self._buckets.setdefault(key, []), row)
+            self._keys[row.id] = key
+            self._graph.setdefault(row.origin, set()).add(row.destination)
+            self._refresh_min(key)
+
+    def remove(self, flight_id: int):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._discard(flight_id)
+
+    def _discard(self, flight_id: int):
+        key = self._keys.pop(flight_id, None)
+        if key is None:
+            return
+        bucket = self._buckets.get(key, [])
+        for i, row in enumerate(bucket):
+            if row.id == flight_id:
+                del bucket[i]
+                break
+        if not bucket:
+            self._buckets.pop(key, None)
+        self._refresh_min(key)
+
+    # keeps the per-route daily minimum in step with one bucket
+    def _refresh_min(self, key):
+        low = _cheapest(self._buckets.get(key, []))
+        if low is None:
+            self._daily_min.pop(key, None)
+        else:
+            self._daily_min[key] = low
+
+    # flights on a route for one day, in departure order, optionally departing no earlier than `after`
+    def departures(self, origin: str, destination: str, day: date, after: datetime | None = None):
+        self.ensure_fresh()
+        with self._lock:
+            bucket = self._buckets.get((origin, destination, day), [])
+            if after is None:
+                return list(bucket)
+            start = bisect_left(bucket, (after,))
+            return bucket[start:]
+
+    # flights on a route departing inside [start, end], which may span midnight
+    def departures_between(self, origin: str, destination: str, start: datetime, end: datetime):
+        self.ensure_fresh()
+        out = []
+        day = start.date()
+        with self._lock:
+            while day <= end.date():
+                bucket = self._buckets.get((origin, destination, day))
+                if bucket:
+                    lo = bisect_left(bucket, (start,))
+                    hi = bisect_right(bucket, (end, float("inf")))
+                    out.extend(bucket[lo:hi])
+                day += timedelta(days=1)
+        return out
+
+    # lowest bookable fare per day for a route over [start, end]; days without flights map to None
+    def daily_minimums(self, origin: str, destination: str, start: date, end: date):
+        self.ensure_fresh()
+        out = {}
+        day = start
+        with self._lock:
+            while day <= end:
+                out[day] = self._daily_min.get((origin, destination, day))
+                day += timedelta(days=1)
+        return out
+
+    # route graph: airport -> airports it has (or had) direct flights to (a copy, safe to iterate)
+    def graph(self):
+        self.ensure_fresh()
+        with self._lock:
+            return {origin: set(dests) for origin, dests in self._graph.items()}
+
+    # every indexed flight on a route, across all days, in departure order
+    def route(self, origin: str, destination: str):
+        self.ensure_fresh()
+        with self._lock:
+            days = sorted(k[2] for k in self._buckets if k[0] == origin and k[1] == destination)
+            out = []
+            for d in days:
+                out.extend(self._buckets.get((origin, destination, d), []))
+        return out
+
+
+flight_index = FlightSearchIndex()
@@ -0,0 +1,119 @@
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from .models import AircraftType, Booking, BookingRecord, Flight, SeatAssignment, SeatMap
+from .seat_inventory import decode_seats, default_blocked, seat_index
+from . import db
+
+# seat allocation engine: a seat is sold when its (flight_id, seat_code) row lands in seat_assignment.
+# the unique constraint on that pair is the lock, so two workers selling the same seat can't both win;
+# the loser's flush fails and its whole booking transaction is rolled back.
+
+
+class SeatConflict(Exception):
+    def __init__(self, seats):
+        self.seats = sorted(set(seats))
+        super().__init__(f"Seats no longer available: {', '.join(self.seats)}")
+
+
+# seat codes already sold on a flight (served from the unique index, no booking JSON involved)
+def occupied_seats(flight_id: int):
+    rows = db.session.query(SeatAssignment.seat_code).filter(SeatAssignment.flight_id == flight_id).all()
+    return [code for (code,) in rows]
+
+
+# blocked seats for a flight; flights seeded before the seat map existed fall back to the default blocks
+def blocked_seats(flight):
+    return blocked_for(flight.aircraft_type, db.session.get(SeatMap, flight.id))
+
+
+# blocked seats from an already loaded seat map row (or None)
+def blocked_for(atype, seat_map):
+    if seat_map and seat_map.aircraft_type_id == atype.id:
+        return decode_seats(atype, seat_map.blocked)
+    return default_blocked(atype)
+
+
+# claims seats for a booking inside the caller's transaction.
+# raises SeatConflict (after rolling the session back) if any seat is invalid, blocked or already sold.
+def claim_seats(flight, codes, booking_ref=None):
+    wanted = [c for c in codes if c]
+    if not wanted:
+        return []
+
+    seen, bad = set(), []
+    for code in wanted:
+        if code in seen:
+            bad.append(code)
+        seen.add(code)
+
+    atype = flight.aircraft_type
+    if atype:
+        blocked = set(blocked_seats(flight))
+        bad.extend(c for c in seen if seat_index(atype, c) is None or c in blocked)
+    if bad:
+        db.session.rollback()
+        raise SeatConflict(bad)
+
+    for code in seen:
+        db.session.add(SeatAssignment(flight_id=flight.id, seat_code=code, booking_ref=booking_ref))
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        taken = set(occupied_seats(flight.id)) & seen
+        raise SeatConflict(taken or seen)
+    return sorted(seen)
+
+
+# frees every seat held by a booking (used on cancellation)
+def release_seats(booking_ref: str):
+    if not booking_ref:
+        return 0
+    return (
+        db.session.query(SeatAssignment)
+        .filter(SeatAssignment.booking_ref == booking_ref)
+        .delete(synchronize_session=False)
+    )
+
+
+# fills seat_assignment from existing bookings the first time (databases from before the table existed).
+# seats of live booking records keep their ref; a staff-side booking only counts for a seat that no
+# booking record on its flight mentions, since those seats were already decided by the record's status.
+def backfill_seat_assignments():
+    if db.session.query(SeatAssignment.id).first():
+        return
+    flights = dict(db.session.query(Flight.id, Flight.aircraft_type_id).all())
+    atypes = {a.id: a for a in AircraftType.query.all()}
+
+    def valid(flight_id, code):
+        if not code or flight_id not in flights:
+            return False
+        atype = atypes.get(flights[flight_id])
+        return atype is None or seat_index(atype, code) is not None
+
+    rows, mentioned = {}, set()
+    records = db.session.query(
+        BookingRecord.flight_id, BookingRecord.booking_ref, BookingRecord.status,
+        BookingRecord.passengers, BookingRecord.created_at,
+    )
+    for flight_id, ref, status, passengers, created_at in records:
+        live = "cancel" not in (status or "").lower()
+        for p in passengers if isinstance(passengers, list) else []:
+            code = p.get("seatCode") if isinstance(p, dict) else None
+            if not code:
+                continue
+            mentioned.add((flight_id, code))
+            if live and valid(flight_id, code):
+                rows.setdefault((flight_id, code), {
+                    "flight_id": flight_id, "seat_code": code, "booking_ref": ref, "created_at": created_at,
+                })
+    for flight_id, code, created_at in db.session.query(Booking.flight_id, Booking.seat_code, Booking.created_at):
+        if (flight_id, code) not in mentioned and valid(flight_id, code):
+            rows.setdefault((flight_id, code), {
+                "flight_id": flight_id, "seat_code": code, "booking_ref": None, "created_at": created_at,
+            })
+
+    if rows:
+        db.session.execute(insert(SeatAssignment), list(rows.values()))
+    db.session.commit()
@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from flask import current_app, session
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+
+from .models import SeatHold
+from .seat_allocation import SeatConflict, blocked_seats, occupied_seats
+from . import db
+
+# seat holds: picking a seat reserves it for SEAT_HOLD_MINUTES so other shoppers see it as "held".
+# holds live in the shared sqlite database so every worker process sees the same state.
+# nothing sweeps the table: reads ignore rows past expires_at, and expired rows are trimmed in small
+# batches off the front of the expires_at index (the index acts as the expiry priority queue).
+
+DEFAULT_HOLD_MINUTES = 10
+PURGE_BATCH = 500
+
+
+def hold_minutes() -> int:
+    return int(current_app.config.get("SEAT_HOLD_MINUTES", DEFAULT_HOLD_MINUTES))
+
+
+# one hold token per browser session, so a shopper's own holds never block them
+def hold_token() -> str:
+    token = session.get("seat_hold_token")
+    if not token:
+        token = uuid4().hex
+        session["seat_hold_token"] = token
+    return token
+
+
+# deletes the oldest expired holds; cost is bounded by the batch, not the table size
+def purge_expired(now: datetime | None = None, limit: int = PURGE_BATCH) -> int:
+    now = now or datetime.utcnow()
+    oldest = (
+        select(SeatHold.id)
+        .where(SeatHold.expires_at <= now)
+        .order_by(SeatHold.expires_at)
+        .limit(limit)
+    )
+    result = db.session.execute(delete(SeatHold).where(SeatHold.id.in_(oldest)))
+    return result.rowcount or 0
+
+
+# seats on a flight currently held by someone other than `exclude_token`
+def held_seats(flight_id: int, exclude_token: str | None = None, now: datetime | None = None):
+    now = now or datetime.utcnow()
+    q = db.session.query(SeatHold.seat_code).filter(
+        SeatHold.flight_id == flight_id,
+        SeatHold.expires_at > now,
+    )
+    if exclude_token:
+        q = q.filter(SeatHold.hold_token != exclude_token)
+    return [code for (code,) in q.all()]
+
+
+# makes `codes` the complete set of seats this token holds on the flight.
+# a seat is won if it is free, or its current hold has expired or already belongs to this token.
+# returns (held, rejected) and commits.
+def place_holds(flight, codes, token: str, now: datetime | None = None):
+    now = now or datetime.utcnow()
+    wanted = {c for c in codes if c}
+    purge_expired(now)
+
+    # drop seats this token no longer wants
+    db.session.execute(
+        delete(SeatHold).where(
+            SeatHold.flight_id == flight.id,
+            SeatHold.hold_token == token,
+            SeatHold.seat_code.notin_(wanted),
+        )
+    )
+
+    unavailable = set(occupied_seats(flight.id))
+    if flight.aircraft_type:
+        unavailable.update(blocked_seats(flight))
+    candidates = sorted(wanted - unavailable)
+
+    if candidates:
+        expires_at = now + timedelta(minutes=hold_minutes())
+        stmt = insert(SeatHold).values([
+            {"flight_id": flight.id, "seat_code": code, "hold_token": token, "expires_at": expires_at}
+            for code in candidates
+        ])
+        existing = SeatHold.__table__.c
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["flight_id", "seat_code"],
+            set_={"hold_token": stmt.excluded.hold_token, "expires_at": stmt.excluded.expires_at},
+            where=(existing.expires_at <= now) | (existing.hold_token == token),
+        )
+        db.session.execute(stmt)
+
+    held = set(
+        code for (code,) in db.session.query(SeatHold.seat_code).filter(
+            SeatHold.flight_id == flight.id,
+            SeatHold.hold_token == token,
+        ).all()
+    )
+    db.session.commit()
+    return sorted(held), sorted(wanted - held)
+
+
+def release_holds(token: str, flight_id: int | None = None) -> int:
+    stmt = delete(SeatHold).where(SeatHold.hold_token == token)
+    if flight_id is not None:
+        stmt = stmt.where(SeatHold.flight_id == flight_id)
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount or 0
+
+
+# turns this token's holds into a sale inside the booking transaction (no commit).
+# raises SeatConflict if another shopper still holds any of the seats.
+def convert_holds(flight, codes, token: str, now: datetime | None = None):
+    now = now or datetime.utcnow()
+    wanted = {c for c in codes if c}
+    if wanted:
+        foreign = set(held_seats(flight.id, exclude_token=token, now=now)) & wanted
+        if foreign:
+            db.session.rollback()
+            raise SeatConflict(foreign)
+    db.session.execute(
+        delete(SeatHold).where(SeatHold.flight_id == flight.id, SeatHold.hold_token == token)
+    )
@@ -0,0 +1,90 @@
+from functools import lru_cache
+
+# compact seat inventory: every flight stores its seat state as a bitmap instead of one row per seat.
+# seat index = (row - 1) * seats_per_row + position of the letter in the layout, so bit i of the
+# bitmap belongs to the i-th seat of the aircraft walking the cabin front to back, left to right.
+
+
+# helps generate seat order for each row.
+def letters_from_layout(layout_str: str):
+    letters = []
+    for group in layout_str.split():
+        letters.extend(list(group))
+    return letters
+
+
+# figures out which cabin/class a given row belongs to based on the aircraft's class_map.
+def cabin_for_row(row: int, class_map):
+    for block in class_map:
+        if block["from"] <= row <= block["to"]:
+            return block["class"]
+    return "Economy"
+
+
+# cached seat plan for a layout: ordered seat codes plus a code -> bit index lookup
+@lru_cache(maxsize=32)
+def _seat_plan(layout: str, total_rows: int):
+    letters = letters_from_layout(layout)
+    codes = tuple(f"{r}{ch}" for r in range(1, total_rows + 1) for ch in letters)
+    index = {code: i for i, code in enumerate(codes)}
+    return codes, index
+
+
+def seat_codes(atype):
+    return _seat_plan(atype.layout, atype.total_rows)[0]
+
+
+def seat_index(atype, code: str):
+    return _seat_plan(atype.layout, atype.total_rows)[1].get(code)
+
+
+def seat_count(atype) -> int:
+    if not atype:
+        return 0
+    return len(seat_codes(atype))
+
+
+# packs a set of seat codes into a bitmap sized for the aircraft (unknown codes are ignored)
+def encode_seats(atype, codes) -> bytes:
+    lookup = _seat_plan(atype.layout, atype.total_rows)[1]
+    bits = 0
+    for code in codes:
+        i = lookup.get(code)
+        if i is not None:
+            bits |= 1 << i
+    return bits.to_bytes((seat_count(atype) + 7) // 8, "little")
+
+
+# unpacks a bitmap back into seat codes in cabin order
+def decode_seats(atype, blob: bytes | None):
+    if not blob:
+        return []
+    codes = seat_codes(atype)
+    bits = int.from_bytes(blob, "little")
+    out = []
+    while bits:
+        low = bits & -bits
+        i = low.bit_length() - 1
+        if i >= len(codes):
+            break
+        out.append(codes[i])
+        bits ^= low
+    return out
+
+
+# seats that are never sold on a fresh flight (row 1 E/F is kept for crew)
+def default_blocked(atype):
+    letters = letters_from_layout(atype.layout)
+    return [f"1{ch}" for ch in letters if ch in ("E", "F")]
+
+
+# sellable seats per cabin for a layout, after taking out blocked seats
+def cabin_capacity(atype, blocked=()):
+    blocked = set(blocked)
+    counts = {}
+    for code in seat_codes(atype):
+        if code in blocked:
+            continue
+        cabin = cabin_for_row(int(code[:-1]), atype.class_map)
+        counts[cabin] = counts.get(cabin, 0) + 1
+    return counts
@@ -0,0 +1,141 @@
+import json
+from functools import lru_cache
+from typing import NamedTuple
+
+from .fares import UPGRADE_CENTS
+from .seat_inventory import cabin_for_row, letters_from_layout
+
+# seat-level prices for the seat map and checkout.
+# everything that depends only on the aircraft and the fare bucket (cabin of each seat, exit rows,
+# window / aisle / extra legroom fees) is worked out once per (layout, rows, class map, bucket) and
+# kept in an lru_cache. a request only adds the flight's price_cents to each precomputed seat,
+# so pricing a whole seat map is one dict comprehension and no database work per seat.
+# cabin upgrades are the same ones checkout charges (fares.UPGRADE_CENTS): a passenger with a seat pays
+# for that seat's cabin whatever class they asked for (seat_cabin). seat fees only apply in economy,
+# premium cabins include every seat.
+
+# fare buckets by base fare: (name, upper bound in cents, exclusive)
+FARE_BUCKETS = (("saver", 20000), ("standard", 60000), ("flex", None))
+
+SEAT_FEES = {
+    "saver": {"exit": 4500, "legroom": 3500, "window": 1500, "aisle": 1200},
+    "standard": {"exit": 3500, "legroom": 2500, "window": 1000, "aisle": 800},
+    "flex": {"exit": 2500, "legroom": 1500, "window": 0, "aisle": 0},
+}
+
+
+class SeatMatrix(NamedTuple):
+    codes: tuple
+    upgrade_cents: tuple
+    fee_cents: tuple
+    exit_rows: tuple
+    legroom_rows: tuple
+    fees: dict  # code -> fee, only seats that have one
+
+
+def fare_bucket(price_cents: int | None) -> str:
+    for name, limit in FARE_BUCKETS:
+        if limit is None or (price_cents or 0) < limit:
+            return name
+    return FARE_BUCKETS[-1][0]
+
+
+def _economy_rows(total_rows: int, class_map):
+    rows = [r for r in range(1, total_rows + 1) if cabin_for_row(r, class_map) == "Economy"]
+    return (rows[0], rows[-1]) if rows else None
+
+
+# over-wing exit pair a third of the way into economy; the first economy row is the bulkhead
+def _row_features(total_rows: int, class_map):
+    economy = _economy_rows(total_rows, class_map)
+    if not economy:
+        return (), ()
+    start, end = economy
+    exit_row = start + (end - start) // 3
+    exits = tuple(r for r in (exit_row, exit_row + 1) if start < r <= end)
+    legroom = (start,) if start not in exits else ()
+    return exits, legroom
+
+
+# window / aisle / middle for each seat letter of a layout
+def seat_positions(layout: str):
+    groups = layout.split()
+    positions = {}
+    for i, group in enumerate(groups):
+        for j, ch in enumerate(group):
+            if (j == 0 and i == 0) or (j == len(group) - 1 and i == len(groups) - 1):
+                positions[ch] = "window"
+            elif j == 0 or j == len(group) - 1:
+                positions[ch] = "aisle"
+            else:
+                positions[ch] = "middle"
+    return positions
+
+
+@lru_cache(maxsize=64)
+def _matrix(layout: str, total_rows: int, class_map_json: str, bucket: str) -> SeatMatrix:
+    class_map = json.loads(class_map_json)
+    fees = SEAT_FEES[bucket]
+    exits, legroom = _row_features(total_rows, class_map)
+    positions = seat_positions(layout)
+    letters = letters_from_layout(layout)
+
+    codes, upgrades, seat_fees = [], [], []
+    for r in range(1, total_rows + 1):
+        cabin = cabin_for_row(r, class_map)
+        upgrade = UPGRADE_CENTS.get(cabin.lower(), 0)
+        row_fee = fees["exit"] if r in exits else fees["legroom"] if r in legroom else 0
+        for ch in letters:
+            codes.append(f"{r}{ch}")
+            upgrades.append(upgrade)
+            if cabin == "Economy":
+                seat_fees.append(row_fee + fees.get(positions[ch], 0))
+            else:
+                seat_fees.append(0)
+    fee_by_code = {code: fee for code, fee in zip(codes, seat_fees) if fee}
+    return SeatMatrix(tuple(codes), tuple(upgrades), tuple(seat_fees), exits, legroom, fee_by_code)
+
+
+def seat_matrix(atype, bucket: str) -> SeatMatrix:
+    return _matrix(atype.layout, atype.total_rows, json.dumps(atype.class_map, sort_keys=True), bucket)
+
+
+# seat map pricing for a flight: total per seat (fare + cabin upgrade + seat fee) and the non-zero seat fees
+def seat_prices(flight, atype):
+    bucket = fare_bucket(flight.price_cents)
+    m = seat_matrix(atype, bucket)
+    base = flight.price_cents or 0
+    prices = {code: base + up + fee for code, up, fee in zip(m.codes, m.upgrade_cents, m.fee_cents)}
+    return {
+        "fare_bucket": bucket,
+        "prices": prices,
+        "seat_fees": dict(m.fees),
+        "exit_rows": list(m.exit_rows),
+        "legroom_rows": list(m.legroom_rows),
+    }
+
+
+# code -> fee for the seats on a flight that carry one (shared, do not modify)
+def seat_fees(flight):
+    atype = flight.aircraft_type
+    if not atype:
+        return {}
+    return seat_matrix(atype, fare_bucket(flight.price_cents)).fees
+
+
+# cabin of a seat on a flight, or None when the flight has no seat plan or the code isn't a seat on it
+def seat_cabin(flight, code) -> str | None:
+    atype = flight.aircraft_type
+    code = code or ""
+    if not atype or not code[:-1].isdigit() or code[-1] not in letters_from_layout(atype.layout):
+        return None
+    row = int(code[:-1])
+    if not 1 <= row <= atype.total_rows:
+        return None
+    return cabin_for_row(row, atype.class_map)
+
+
+# seat fees owed for the seats picked at checkout (unknown or empty codes cost nothing)
+def seat_fee_cents(flight, codes) -> int:
+    fees = seat_fees(flight)
+    return sum(fees.get(code or "", 0) for code in codes)
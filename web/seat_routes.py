@@ -1,5 +1,9 @@
-from flask import Blueprint, render_template, jsonify
-from web.models import Flight, AircraftType, Seat
+from flask import Blueprint, render_template, jsonify, request
+from web.models import Flight, AircraftType
+from web.seat_allocation import blocked_seats, occupied_seats
+from web.seat_holds import held_seats, hold_minutes, hold_token, place_holds, release_holds
+from web.availability import availability_for
+from web.seat_pricing import seat_prices
 from web import db
 
 bp = Blueprint("seats", __name__)
@@ -18,15 +22,11 @@ def seats_api(flight_id):
     if not at:
         return jsonify({"error": "aircraft_not_found"}), 404
 
-    blocked = []
-    rows = (
-        db.session.query(Seat.row_num, Seat.seat_letter, Seat.is_blocked)
-        .filter(Seat.flight_id == flight_id)
-        .all()
-    )
-    for r, ch, is_blocked in rows:
-        if is_blocked:
-            blocked.append(f"{r}{ch}")
+    blocked = blocked_seats(f)
+    occupied = occupied_seats(flight_id)
+    held = held_seats(flight_id, exclude_token=hold_token())
+
+    pricing = seat_prices(f, at)
 
     return jsonify({
         "flight_id": flight_id,
@@ -36,8 +36,35 @@ def seats_api(flight_id):
         "rows": at.total_rows,
         "layout": at.layout,       
         "classes": at.class_map,   
-        "occupied": [],             
-        "held": [],                 
+        "occupied": occupied,
+        "held": held,
         "blocked": blocked,
-        "prices": {}                
+        "availability": availability_for([f]).get(flight_id, {}),
+        "base_price_cents": f.price_cents or 0,
+        **pricing,
     })
+
+# replaces this browser's holds on the flight with the posted seat list
+@bp.post("/api/flights/<int:flight_id>/holds")
+def hold_seats(flight_id):
+    f = db.session.get(Flight, flight_id)
+    if not f:
+        return jsonify({"error": "flight_not_found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    seats = data.get("seats") or []
+    if not isinstance(seats, list):
+        return jsonify({"error": "invalid_seats"}), 400
+
+    held, rejected = place_holds(f, [str(s) for s in seats][:9], hold_token())
+    return jsonify({
+        "held": held,
+        "rejected": rejected,
+        "hold_minutes": hold_minutes(),
+    }), (409 if rejected else 200)
+
+
+@bp.delete("/api/flights/<int:flight_id>/holds")
+def drop_holds(flight_id):
+    release_holds(hold_token(), flight_id)
+    return jsonify({"ok": True})
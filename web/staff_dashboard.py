@@ -1,12 +1,17 @@
 from datetime import datetime, timedelta, UTC
 from io import StringIO
 import csv
+import zlib
 from types import SimpleNamespace
 
-from flask import Blueprint, render_template, request, Response
+from flask import Blueprint, render_template, request, Response, stream_with_context
 from flask_login import login_required, current_user
 
-from .models import Flight, Seat, Booking, Customer
+from sqlalchemy import exists, func
+
+from .models import Flight, Booking, BookingRecord, Customer, CabinInventory
+from .seat_inventory import seat_count
+from .customer_search import fts_available, search_customers
 from . import db
 
 staff_dashboard_bp = Blueprint("staff_dashboard", __name__, url_prefix="/staff")
@@ -37,50 +42,78 @@ def _compute_flight_status(now: datetime, depart_time: datetime) -> str:
     return "Scheduled"
 
 
-@staff_dashboard_bp.route("/dashboard")
-@login_required
-def dashboard():
-    if not current_user.is_staff:
-        return "Forbidden", 403
+# staff-side bookings still flying: entered by staff, or mirroring an online booking that wasn't cancelled
+def _live_booking():
+    cancelled = exists().where(
+        BookingRecord.booking_ref == Booking.booking_ref,
+        func.lower(func.coalesce(BookingRecord.status, "")).contains("cancel"),
+    )
+    return Booking.booking_ref.is_(None) | ~cancelled
 
-    now, today_start, today_end = _today_window()
 
-    # today’s flights
-    today_start_naive = today_start.replace(tzinfo=None)
-    today_end_naive = today_end.replace(tzinfo=None)
+# daily operations snapshot: the window's flights with seats sold and booking counts joined in.
+# one statement driven by the depart_time index, so cost depends on the day's flights, not the table.
+def _daily_snapshot(now: datetime, start: datetime, end: datetime):
+    in_window = (Flight.depart_time >= start) & (Flight.depart_time < end)
 
-    flights_today = (
-        Flight.query
+    sold = (
+        db.session.query(CabinInventory.flight_id, func.sum(CabinInventory.sold).label("sold"))
+        .join(Flight, Flight.id == CabinInventory.flight_id)
+        .filter(in_window)
+        .group_by(CabinInventory.flight_id)
+        .subquery()
+    )
+    booked = (
+        db.session.query(Booking.flight_id, func.count(Booking.id).label("booked"))
+        .join(Flight, Flight.id == Booking.flight_id)
+        .filter(in_window, _live_booking())
+        .group_by(Booking.flight_id)
+        .subquery()
+    )
+
+    rows = (
+        db.session.query(Flight, func.coalesce(sold.c.sold, 0), func.coalesce(booked.c.booked, 0))
+        .outerjoin(sold, sold.c.flight_id == Flight.id)
+        .outerjoin(booked, booked.c.flight_id == Flight.id)
+        .filter(in_window)
         .order_by(Flight.depart_time.asc())
         .all()
     )
 
+    snapshot = []
+    for f, seats_booked, passengers in rows:
+        snapshot.append(SimpleNamespace(
+            id=f.id,
+            code=f"{f.origin}{f.destination}-{f.id}",
+            origin=f.origin,
+            destination=f.destination,
+            depart_time=f.depart_time,
+            status=_compute_flight_status(now, _to_utc(f.depart_time)),
+            # capacity comes straight from the (eager loaded) aircraft layout
+            seats_total=seat_count(f.aircraft_type),
+            seats_booked=int(seats_booked),
+            passengers=int(passengers),
+        ))
+    return snapshot
 
 
-    enriched_flights = []
-    for f in flights_today:
-        depart_utc = _to_utc(f.depart_time)
-        status = _compute_flight_status(now, depart_utc)
+@staff_dashboard_bp.route("/dashboard")
+@login_required
+def dashboard():
+    if not current_user.is_staff:
+        return "Forbidden", 403
 
-        total_seats = (
-            db.session.query(Seat.id)
-            .filter(Seat.flight_id == f.id)
-            .count()
-        )
+    now, today_start, today_end = _today_window()
 
-        seats_booked = 0  
+    # today’s flights
+    today_start_naive = today_start.replace(tzinfo=None)
+    today_end_naive = today_end.replace(tzinfo=None)
 
-        f.code = f"{f.origin}{f.destination}-{f.id}"
-        f.status = status
-        f.seats_total = total_seats
-        f.seats_booked = seats_booked
-        enriched_flights.append(f)
+    enriched_flights = _daily_snapshot(now, today_start_naive, today_end_naive)
 
     completed = sum(1 for f in enriched_flights if f.status == "Departed")
     upcoming = len(enriched_flights) - completed
-
-    total_capacity = sum(f.seats_total for f in enriched_flights)
-    passengers_today = total_capacity
+    passengers_today = sum(f.passengers for f in enriched_flights)
 
     stats = {
         "flights_today": len(enriched_flights),
@@ -98,7 +131,19 @@ def dashboard():
 
     customers = None
 
-    if any([first, last, email, phone, booking_ref]):
+    if any([first, last, email, phone, booking_ref]) and fts_available():
+        # ranked booking ids from the full-text index, then one primary-key fetch
+        ids = search_customers(first, last, email, phone, booking_ref, limit=100)
+        found = (
+            db.session.query(Booking, Customer, Flight)
+            .join(Customer, Booking.customer_id == Customer.id)
+            .join(Flight, Booking.flight_id == Flight.id)
+            .filter(Booking.id.in_(ids))
+            .all()
+        ) if ids else []
+        order = {bid: i for i, bid in enumerate(ids)}
+        rows = sorted(found, key=lambda row: order[row[0].id])
+    elif any([first, last, email, phone, booking_ref]):
         q = (
             db.session.query(Booking, Customer, Flight)
             .join(Customer, Booking.customer_id == Customer.id)
@@ -124,6 +169,7 @@ def dashboard():
 
         rows = q.limit(100).all()
 
+    if any([first, last, email, phone, booking_ref]):
         customers = []
         for b, c, f in rows:
             depart_utc = _to_utc(f.depart_time)
@@ -150,6 +196,72 @@ def dashboard():
     )
 
 
+# export window from ?start=YYYY-MM-DD&end=YYYY-MM-DD (end inclusive, defaults to today) and ?airport=XXX
+def _export_filters(today_start: datetime):
+    start = today_start.replace(tzinfo=None)
+    end = start
+    try:
+        if request.args.get("start"):
+            start = datetime.strptime(request.args["start"], "%Y-%m-%d")
+            end = start
+        if request.args.get("end"):
+            end = datetime.strptime(request.args["end"], "%Y-%m-%d")
+    except ValueError:
+        return None
+    if end < start:
+        return None
+    airport = (request.args.get("airport") or "").upper().strip() or None
+    return start, end + timedelta(days=1), airport
+
+
+def _export_query(query, start: datetime, end: datetime, airport: str | None):
+    query = query.filter(Flight.depart_time >= start, Flight.depart_time < end)
+    if airport:
+        query = query.filter((Flight.origin == airport) | (Flight.destination == airport))
+    return query
+
+
+# turns a header + row generator into csv text chunks of roughly `chunk` bytes
+def _csv_chunks(header, rows, chunk=64 * 1024):
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= chunk:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def _gzip_chunks(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for piece in chunks:
+        data = z.compress(piece.encode("utf-8"))
+        if data:
+            yield data
+    yield z.flush()
+
+
+# streams rows straight from the cursor to the client, so memory stays flat for any export size
+def _csv_response(header, rows, filename: str):
+    chunks = _csv_chunks(header, rows)
+    if request.args.get("gzip") in ("1", "true", "yes"):
+        resp = Response(stream_with_context(_gzip_chunks(chunks)), mimetype="application/gzip")
+        filename += ".gz"
+    else:
+        resp = Response(stream_with_context(chunks), mimetype="text/csv")
+    resp.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return resp
+
+
+def _export_name(prefix: str, start: datetime, end: datetime, airport: str | None) -> str:
+    last = end - timedelta(days=1)
+    span = start.strftime("%Y%m%d") if last == start else f"{start:%Y%m%d}-{last:%Y%m%d}"
+    return f"{prefix}_{span}{'_' + airport if airport else ''}.csv"
+
+
 @staff_dashboard_bp.route("/download-today-report")
 @login_required
 def download_today_report():
@@ -157,44 +269,35 @@ def download_today_report():
         return "Forbidden", 403
 
     now, today_start, today_end = _today_window()
-    today_start_naive = today_start.replace(tzinfo=None)
-    today_end_naive = today_end.replace(tzinfo=None)
-
-    flights_today = (
-        Flight.query
-        .order_by(Flight.depart_time.asc())
-        .all()
-    )
-
-    output = StringIO()
-    writer = csv.writer(output)
+    filters = _export_filters(today_start)
+    if not filters:
+        return "Invalid date range", 400
+    start, end, airport = filters
+
+    query = _export_query(
+        db.session.query(Flight.id, Flight.origin, Flight.destination, Flight.depart_time),
+        start, end, airport,
+    ).order_by(Flight.depart_time.asc(), Flight.id.asc())
+
+    def rows():
+        for fid, origin, destination, depart in query.yield_per(1000):
+            depart_utc = _to_utc(depart)
+            yield [
+                f"{origin}{destination}-{fid}",
+                origin,
+                destination,
+                depart_utc.isoformat(),
+                _compute_flight_status(now, depart_utc),
+            ]
 
-    writer.writerow([
+    header = [
         "Flight Code",
         "Origin",
         "Destination",
         "Departure (UTC)",
         "Status",
-    ])
-
-    for f in flights_today:
-        depart_utc = _to_utc(f.depart_time)
-        status = _compute_flight_status(now, depart_utc)
-        code = f"{f.origin}{f.destination}-{f.id}"
-        writer.writerow([
-            code,
-            f.origin,
-            f.destination,
-            depart_utc.isoformat(),
-            status,
-        ])
-
-    csv_data = output.getvalue()
-    output.close()
-
-    resp = Response(csv_data, mimetype="text/csv")
-    resp.headers["Content-Disposition"] = "attachment; filename=today_flights.csv"
-    return resp
+    ]
+    return _csv_response(header, rows(), _export_name("flights", start, end, airport))
 
 
 @staff_dashboard_bp.route("/download-today-manifest")
@@ -204,20 +307,46 @@ def download_today_manifest():
         return "Forbidden", 403
 
     now, today_start, today_end = _today_window()
-
-    today_start_naive = today_start.replace(tzinfo=None)
-    today_end_naive = today_end.replace(tzinfo=None)
-
-    flights_today = (
-        Flight.query
-        .order_by(Flight.depart_time.asc())
-        .all()
-    )
-
-    output = StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow([
+    filters = _export_filters(today_start)
+    if not filters:
+        return "Invalid date range", 400
+    start, end, airport = filters
+
+    # one joined query instead of lazy-loading bookings and customers per flight
+    query = _export_query(
+        db.session.query(
+            Flight.id,
+            Flight.origin,
+            Flight.destination,
+            Flight.depart_time,
+            Booking.id,
+            Booking.seat_code,
+            Customer.first_name,
+            Customer.last_name,
+            Customer.email,
+            Customer.phone,
+        )
+        .join(Booking, Booking.flight_id == Flight.id)
+        .outerjoin(Customer, Booking.customer_id == Customer.id)
+        .filter(_live_booking()),
+        start, end, airport,
+    ).order_by(Flight.depart_time.asc(), Flight.id.asc(), Booking.id.asc())
+
+    def rows():
+        for fid, origin, destination, depart, bid, seat, first, last, email, phone in query.yield_per(1000):
+            yield [
+                f"{origin}{destination}-{fid}",
+                origin,
+                destination,
+                _to_utc(depart).isoformat(),
+                f"BK-{bid:06d}",
+                seat or "-",
+                f"{first or ''} {last or ''}".strip(),
+                email,
+                phone,
+            ]
+
+    header = [
         "Flight Code",
         "Origin",
         "Destination",
@@ -227,30 +356,5 @@ def download_today_manifest():
         "Passenger Name",
         "Email",
         "Phone",
-    ])
-
-    for f in flights_today:
-        depart_utc = _to_utc(f.depart_time)
-        flight_code = f"{f.origin}{f.destination}-{f.id}"
-
-        for b in f.bookings: 
-            c = b.customer
-            writer.writerow([
-                flight_code,
-                f.origin,
-                f.destination,
-                depart_utc.isoformat(),
-                f"BK-{b.id:06d}",
-                b.seat_code or "-",
-                f"{c.first_name} {c.last_name}",
-                c.email,
-                c.phone,
-            ])
-
-    csv_data = output.getvalue()
-    output.close()
-
-    resp = Response(csv_data, mimetype="text/csv")
-    resp.headers["Content-Disposition"] = "attachment; filename=today_passenger_manifest.csv"
-    return resp
-
+    ]
+    return _csv_response(header, rows(), _export_name("passenger_manifest", start, end, airport))
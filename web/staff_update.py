@@ -1,39 +1,53 @@
 from flask import Blueprint, render_template, request, redirect, url_for
 from flask_login import login_required
 from web.models import Flight
+from web.search_index import flight_index
+from web.trip_stats import invalidate_trip_stats
+from web.status_fanout import record_status_change, wake_fanout
 from web import db
 
 staff_update_bp = Blueprint("staff_update", __name__, url_prefix="/staff/update")
 
+# loaded after any commit, so rendering the list doesn't lazy-load each expired flight again
+def _flights():
+    return Flight.query.order_by(Flight.depart_time.asc()).all()
+
+
 # allows staff to update the status and optional note for any flight
 
 @staff_update_bp.route("/", methods=["GET", "POST"])
 @login_required
 def update_status():
-    flights = Flight.query.order_by(Flight.depart_time.asc()).all()
-
     if request.method == "POST":
-        flight_id = request.form.get("flight_id")
+        # one flight from the form, or many at once (e.g. an airport-wide disruption)
+        flight_ids = request.form.getlist("flight_id", type=int)
         status = request.form.get("status")
         note = request.form.get("note", "")
 
-        f = Flight.query.get(flight_id)
-        if not f:
+        changed = Flight.query.filter(Flight.id.in_(flight_ids)).all() if flight_ids else []
+        if not changed:
             return render_template(
                 "staff_update.html",
-                flights=flights,
+                flights=_flights(),
                 message="Flight not found."
             )
 
-        # save the update
-        f.status = status
-        f.status_note = note
+        # save the update; passengers are notified in the background by the status fan-out job
+        for f in changed:
+            if f.status != status or (note and note != f.status_note):
+                record_status_change(f, status, note)
+            f.status = status
+            f.status_note = note
         db.session.commit()
+        for f in changed:
+            flight_index.upsert(f)
+        invalidate_trip_stats()
+        wake_fanout()
 
         return render_template(
             "staff_update.html",
-            flights=flights,
+            flights=_flights(),
             message="Flight status updated successfully"
         )
 
-    return render_template("staff_update.html", flights=flights)
\ No newline at end of file
+    return render_template("staff_update.html", flights=_flights())
\ No newline at end of file
@@ -0,0 +1,154 @@
+import threading
+from datetime import datetime
+
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy import exists, func, or_, select
+
+from .models import Booking, BookingRecord, Customer, Flight, FlightStatusChange, Subscriber
+from .outbox import enqueue_many, wake_worker
+from . import db
+
+# fan-out of flight status changes to everyone booked on the flight.
+# the staff request only records a flight_status_change row; this job expands each change into
+# contacts (booking records, staff-side bookings and subscribers, all found through a flight_id index),
+# drops duplicate emails / phone numbers and queues the messages in the outbox in chunks.
+# a change is marked processed in the same transaction as its messages, and every message carries a
+# dedupe key, so a crash part-way through never sends anything twice.
+
+DEFAULT_CHANGES = 50
+CHUNK = 1000
+
+_wake = threading.Event()
+
+
+# lets the job pick up a committed change without waiting for its next poll
+def wake_fanout():
+    _wake.set()
+
+
+def wake_event():
+    return _wake
+
+
+# queues a status change for fan-out (no commit)
+def record_status_change(flight, status, note=None):
+    db.session.add(FlightStatusChange(flight_id=flight.id, status=status, note=note))
+
+
+def _digits(value) -> str:
+    return "".join(ch for ch in (value or "") if ch.isdigit())
+
+
+# unique (email, phone) contacts for a flight; a person reachable both ways is only emailed/texted once.
+# staff-side bookings carry no status, so a customer is only contacted through them when no booking
+# record on the flight belongs to them (staff-entered bookings); everyone who booked online is
+# reached through their booking record, which drops out once cancelled.
+def _contacts(flight_id: int):
+    records = select(BookingRecord.primary_email, BookingRecord.primary_phone).where(
+        BookingRecord.flight_id == flight_id,
+        ~func.lower(func.coalesce(BookingRecord.status, "")).contains("cancel"),
+    )
+    has_record = exists().where(
+        BookingRecord.flight_id == flight_id,
+        or_(
+            func.lower(BookingRecord.primary_email) == func.lower(Customer.email),
+            func.lower(Customer.email) == "guest-" + func.lower(BookingRecord.booking_ref) + "@example.com",
+        ),
+    )
+    customers = (
+        select(Customer.email, Customer.phone)
+        .join(Booking, Booking.customer_id == Customer.id)
+        .where(Booking.flight_id == flight_id, ~has_record)
+        .distinct()
+    )
+    subscribers = select(Subscriber.email, Subscriber.phone).where(Subscriber.flight_id == flight_id)
+    emails, phones = {}, {}
+    for stmt in (records, customers, subscribers):
+        for email, phone in db.session.execute(stmt):
+            if email and email.strip():
+                emails.setdefault(email.strip().lower(), email.strip())
+            digits = _digits(phone)
+            if len(digits) >= 7:
+                phones.setdefault(digits, phone.strip())
+    return list(emails.values()), list(phones.values())
+
+
+def _messages(change, flight):
+    code = f"SW{flight.id:04d}"
+    when = flight.depart_time.strftime("%b %d, %Y %H:%M") if flight.depart_time else "TBD"
+    note = f"<p>{escape(change.note)}</p>" if change.note else ""
+    email_body = (
+        f"<h3>Flight {code} is now {escape(change.status)}</h3>"
+        f"<p>{escape(flight.origin)} → {escape(flight.destination)}, departing {when}.</p>{note}"
+    )
+    sms_body = f"SkyWings: flight {code} {flight.origin}-{flight.destination} ({when}) is now {change.status}."
+    if change.note:
+        sms_body += f" {change.note}"
+
+    emails, phones = _contacts(flight.id)
+    for email in emails:
+        yield {
+            "channel": "email",
+            "recipient": email,
+            "subject": f"Flight {code} status update: {change.status}",
+            "body": email_body,
+            "dedupe_key": f"flight-status:{change.id}:email:{email.lower()}",
+        }
+    for phone in phones:
+        yield {
+            "channel": "sms",
+            "recipient": phone,
+            "body": sms_body,
+            "dedupe_key": f"flight-status:{change.id}:sms:{_digits(phone)}",
+        }
+
+
+def _fan_out_batch(limit: int):
+    changes = (
+        FlightStatusChange.query.filter(FlightStatusChange.processed_at.is_(None))
+        .order_by(FlightStatusChange.id)
+        .limit(limit)
+        .all()
+    )
+    if not changes:
+        return 0, 0
+
+    # several updates to one flight in a row only need the latest one announced
+    latest = {}
+    for change in changes:
+        latest[change.flight_id] = change
+    flights = {f.id: f for f in Flight.query.filter(Flight.id.in_(list(latest))).all()}
+
+    queued = 0
+    now = datetime.utcnow()
+    for change in changes:
+        flight = flights.get(change.flight_id)
+        if flight is not None and latest[change.flight_id] is change:
+            chunk = []
+            for message in _messages(change, flight):
+                chunk.append(message)
+                if len(chunk) >= CHUNK:
+                    enqueue_many(chunk)
+                    queued += len(chunk)
+                    chunk = []
+            enqueue_many(chunk)
+            queued += len(chunk)
+        change.processed_at = now
+        db.session.commit()
+    return len(changes), queued
+
+
+# one pass of the job: expands pending status changes into outbox messages. returns messages queued.
+def fan_out_status_changes(limit: int | None = None, max_batches: int = 20) -> int:
+    limit = limit or current_app.config.get("STATUS_FANOUT_BATCH", DEFAULT_CHANGES)
+    queued = 0
+    for _ in range(max_batches):
+        changes, messages = _fan_out_batch(limit)
+        queued += messages
+        if messages:
+            # let the outbox start sending while the next batch is expanded
+            wake_worker()
+        if changes < limit:
+            break
+    return queued
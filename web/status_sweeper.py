@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from .models import BookingRecord, Flight, JobState
+from . import db
+
+# moves bookings on departed flights to "Departed" in set-based batches.
+# the job remembers how far it got (job_state.watermark), so each run only looks at flights whose
+# departure falls between the last run and now, found through the flight.depart_time index.
+# a first run (or a long outage) is caught up one day-sized slice per transaction.
+
+JOB_NAME = "status-sweeper"
+SLICE = timedelta(days=1)
+
+
+def _mark_departed(start: datetime | None, end: datetime) -> int:
+    departed = select(Flight.id).where(Flight.depart_time <= end)
+    if start is not None:
+        departed = departed.where(Flight.depart_time > start)
+
+    result = db.session.execute(
+        update(BookingRecord)
+        .where(
+            BookingRecord.flight_id.in_(departed),
+            (BookingRecord.status.is_(None))
+            | ((BookingRecord.status != "Departed") & ~func.lower(BookingRecord.status).contains("cancel")),
+        )
+        .values(status="Departed")
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def sweep_departed(now: datetime | None = None) -> int:
+    now = now or datetime.utcnow()
+    state = db.session.get(JobState, JOB_NAME)
+    if state is None:
+        state = JobState(name=JOB_NAME, watermark=None)
+        db.session.add(state)
+
+    if state.watermark is None:
+        first = db.session.query(func.min(Flight.depart_time)).scalar()
+        if first is None:
+            db.session.commit()
+            return 0
+        state.watermark = first - timedelta(seconds=1)
+
+    updated = 0
+    while state.watermark < now:
+        end = min(state.watermark + SLICE, now)
+        updated += _mark_departed(state.watermark, end)
+        state.watermark = end
+        db.session.commit()
+    return updated
@@ -0,0 +1,140 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, has_request_context, session
+from sqlalchemy import and_, case, func, or_
+
+from .models import BookingRecord, Flight, FlightStatusChange
+from . import db
+
+# per-user trip statistics for the account dashboard.
+# counts come from one aggregate query (no per-booking python loop) and are cached per process.
+# an entry expires after TRIP_STATS_TTL seconds or at the user's next departure (when an upcoming
+# trip turns into a completed one), whichever is first. booking, cancel and rebook calls drop the
+# entry and bump a per-session epoch that is part of the cache key, so other worker processes miss
+# their copy too. staff status changes clear this process's cache, and since each one records a
+# flight_status_change row, the newest of those ids is in the key as well: every process misses
+# after a status update. a full cache drops expired entries, then the oldest.
+
+DEFAULT_TTL = 300
+MAX_ENTRIES = 10000
+
+_lock = threading.Lock()
+_cache: dict[tuple, tuple[float, dict]] = {}
+
+
+# bookings that belong to the user: linked by user_id, or guest bookings made with their email.
+# returned as separate filters so callers can walk each one down its own index.
+def booking_owners(user):
+    filters = [BookingRecord.user_id == user.id]
+    if user.email:
+        filters.append(and_(BookingRecord.user_id.is_(None), BookingRecord.primary_email == user.email))
+    return filters
+
+
+def booking_criteria(user):
+    filters = booking_owners(user)
+    return or_(*filters) if len(filters) > 1 else filters[0]
+
+
+def _ttl() -> float:
+    return float(current_app.config.get("TRIP_STATS_TTL", DEFAULT_TTL))
+
+
+def _epoch() -> int:
+    return session.get("trip_stats_epoch", 0) if has_request_context() else 0
+
+
+# shared by every process: moves whenever staff record a flight status change
+def _status_epoch() -> int:
+    return db.session.query(func.max(FlightStatusChange.id)).scalar() or 0
+
+
+# sql filters splitting a user's bookings into the My Bookings tabs (upcoming / past / cancelled)
+def tab_filters(now: datetime):
+    status = func.lower(func.coalesce(BookingRecord.status, Flight.status, "On time"))
+    cancelled = status.contains("cancel")
+    past = and_(~cancelled, or_(Flight.depart_time <= now, status.contains("depart")))
+    upcoming = and_(~cancelled, ~status.contains("depart"), or_(Flight.depart_time.is_(None), Flight.depart_time > now))
+    return {"upcoming": upcoming, "past": past, "cancelled": cancelled}
+
+
+def _compute(user, now: datetime):
+    tabs = tab_filters(now)
+    is_upcoming, is_completed, is_cancelled = tabs["upcoming"], tabs["past"], tabs["cancelled"]
+
+    upcoming, completed, cancelled, total_paid_cents, next_departure = (
+        db.session.query(
+            func.coalesce(func.sum(case((is_upcoming, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((is_completed, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((is_cancelled, 1), else_=0)), 0),
+            func.coalesce(func.sum(BookingRecord.total_paid_cents), 0),
+            func.min(case((is_upcoming, Flight.depart_time), else_=None)),
+        )
+        .join(Flight, BookingRecord.flight_id == Flight.id)
+        .filter(booking_criteria(user))
+        .one()
+    )
+
+    latest = (
+        db.session.query(BookingRecord.status, Flight.status, Flight.depart_time)
+        .join(Flight, BookingRecord.flight_id == Flight.id)
+        .filter(booking_criteria(user))
+        .order_by(BookingRecord.created_at.desc())
+        .first()
+    )
+    status_overview = "No trips yet"
+    if latest:
+        rec_status, flight_status, depart = latest
+        status_overview = rec_status or flight_status or "On time"
+        if depart and depart <= now and "cancel" not in status_overview.lower():
+            status_overview = "Departed"
+
+    stats = {
+        "trip_count": int(upcoming) + int(completed),
+        "upcoming": int(upcoming),
+        "completed": int(completed),
+        "cancelled": int(cancelled),
+        "saved": int(total_paid_cents) / 100,
+        "alerts": 0,
+        "status": status_overview,
+    }
+    return stats, next_departure
+
+
+def trip_stats(user, now: datetime | None = None):
+    now = now or datetime.utcnow()
+    key = (user.id, user.email, _epoch(), _status_epoch())
+    with _lock:
+        hit = _cache.get(key)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+
+    stats, next_departure = _compute(user, now)
+    ttl = _ttl()
+    if next_departure:
+        ttl = min(ttl, max(0.0, (next_departure - now).total_seconds()))
+    with _lock:
+        if len(_cache) >= MAX_ENTRIES:
+            clock = time.monotonic()
+            for stale in [k for k, (expires, _) in _cache.items() if expires <= clock]:
+                del _cache[stale]
+            # dicts keep insertion order, so the first keys are the oldest entries
+            while len(_cache) >= MAX_ENTRIES:
+                del _cache[next(iter(_cache))]
+        _cache.pop(key, None)
+        _cache[key] = (time.monotonic() + ttl, stats)
+    return stats
+
+
+# drops cached stats for a user (or everyone when user_id is None)
+def invalidate_trip_stats(user_id: int | None = None):
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            for key in [k for k in _cache if k[0] == user_id]:
+                del _cache[key]
+    if user_id is not None and has_request_context():
+        session["trip_stats_epoch"] = _epoch() + 1